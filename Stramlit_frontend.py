@@ -1,23 +1,176 @@
+import bisect
+import hashlib
+import heapq
+import importlib
+import importlib.util
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+import weakref
+from array import array
+from collections import Counter, OrderedDict, deque
+from collections.abc import Sequence
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+
 import streamlit as st
 import requests
-import pandas as pd
-import plotly.graph_objects as go
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger("recommender")
+
+class LazyModule:
+    """Módulo que se importa al acceder a su primer atributo
+
+    pandas, numpy, pyarrow y plotly tardan cientos de ms en importarse y la
+    página inicial (formulario y barra lateral) no los necesita.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+def optional_module(name):
+    """LazyModule si el paquete está instalado y None si no (sin importarlo todavía)"""
+    return LazyModule(name) if importlib.util.find_spec(name) is not None else None
+
+np = LazyModule("numpy")
+pd = LazyModule("pandas")
+go = LazyModule("plotly.graph_objects")
+# Formatos binarios opcionales para las respuestas (sin ellos se negocia JSON)
+pa = optional_module("pyarrow")
+msgpack = optional_module("msgpack")
 
 # ==========================================
 # CONFIGURACIÓN
 # ==========================================
-API_URL = "http://127.0.0.1:8000/recommend"
+API_BASE_URL = os.environ.get("RECOMMENDER_API_URL", "http://127.0.0.1:8000").rstrip("/")
+# Réplicas de la API separadas por comas (por defecto, solo RECOMMENDER_API_URL)
+API_REPLICA_URLS = [
+    url.strip().rstrip("/") for url in os.environ.get("RECOMMENDER_API_URLS", API_BASE_URL).split(",")
+    if url.strip()
+]
+
+# Cliente HTTP compartido (pool de conexiones keep-alive por proceso)
+API_CONNECT_TIMEOUT = float(os.environ.get("RECOMMENDER_CONNECT_TIMEOUT", "3.05"))
+API_READ_TIMEOUT = float(os.environ.get("RECOMMENDER_READ_TIMEOUT", "10"))
+API_POOL_SIZE = int(os.environ.get("RECOMMENDER_POOL_SIZE", "32"))
+API_MAX_RETRIES = int(os.environ.get("RECOMMENDER_MAX_RETRIES", "2"))
+API_RETRY_BACKOFF = float(os.environ.get("RECOMMENDER_RETRY_BACKOFF", "0.3"))
+
+# Formatos de respuesta de /recommend por orden de preferencia (arrow, msgpack, json)
+RESPONSE_FORMATS = [
+    fmt.strip() for fmt in os.environ.get("RECOMMENDER_RESPONSE_FORMATS", "arrow,msgpack,json").split(",")
+    if fmt.strip()
+]
+
+# Balanceo entre réplicas: petición duplicada (hedging) tras el p95 y disyuntor por réplica
+HEDGE_ENABLED = os.environ.get("RECOMMENDER_HEDGE", "1") == "1"
+HEDGE_QUANTILE = float(os.environ.get("RECOMMENDER_HEDGE_QUANTILE", "0.95"))
+HEDGE_MIN_DELAY = float(os.environ.get("RECOMMENDER_HEDGE_MIN_DELAY", "0.05"))
+HEDGE_INITIAL_DELAY = float(os.environ.get("RECOMMENDER_HEDGE_INITIAL_DELAY", "0.5"))
+HEDGE_MIN_SAMPLES = int(os.environ.get("RECOMMENDER_HEDGE_MIN_SAMPLES", "20"))
+# Como mucho esta fracción de las peticiones se duplica (con una pequeña reserva para ráfagas)
+HEDGE_BUDGET = float(os.environ.get("RECOMMENDER_HEDGE_BUDGET", "0.1"))
+HEDGE_BUDGET_BURST = float(os.environ.get("RECOMMENDER_HEDGE_BUDGET_BURST", "5"))
+BREAKER_FAILURES = int(os.environ.get("RECOMMENDER_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.environ.get("RECOMMENDER_BREAKER_COOLDOWN", "30"))
+
+# Sonda de salud en segundo plano (una por réplica)
+HEALTH_INTERVAL = float(os.environ.get("RECOMMENDER_HEALTH_INTERVAL", "15"))
+HEALTH_TIMEOUT = float(os.environ.get("RECOMMENDER_HEALTH_TIMEOUT", "2"))
+
+# Caché de respuestas compartida entre sesiones
+CACHE_MAX_ENTRIES = int(os.environ.get("RECOMMENDER_CACHE_MAX_ENTRIES", "2000"))
+CACHE_MAX_BYTES = int(float(os.environ.get("RECOMMENDER_CACHE_MAX_MB", "64")) * 1024 * 1024)
+CACHE_TTL = float(os.environ.get("RECOMMENDER_CACHE_TTL", "3600"))
+CACHE_NEGATIVE_TTL = float(os.environ.get("RECOMMENDER_CACHE_NEGATIVE_TTL", "120"))
+# DataFrames normalizados compartidos (uno por respuesta), acotados también en bytes
+FRAME_CACHE_MAX_BYTES = int(float(os.environ.get("RECOMMENDER_FRAME_CACHE_MAX_MB", "32")) * 1024 * 1024)
+
+# Motor de recomendación: "http" (API) o "embedded" (KNN en proceso sobre un catálogo local)
+ENGINE_MODE = os.environ.get("RECOMMENDER_ENGINE", "http")
+CATALOG_DIR = os.environ.get("RECOMMENDER_CATALOG_DIR", "catalog")
+EMBEDDED_K = int(os.environ.get("RECOMMENDER_EMBEDDED_K", "10"))
+EMBEDDED_RETRY_INTERVAL = float(os.environ.get("RECOMMENDER_EMBEDDED_RETRY_INTERVAL", "30"))
+
+# Autocompletado local (índice de trigramas sobre una instantánea del catálogo)
+AUTOCOMPLETE_SNAPSHOT = os.environ.get("RECOMMENDER_AUTOCOMPLETE_SNAPSHOT", "")
+AUTOCOMPLETE_REFRESH_INTERVAL = float(os.environ.get("RECOMMENDER_AUTOCOMPLETE_REFRESH", "60"))
+AUTOCOMPLETE_LIMIT = int(os.environ.get("RECOMMENDER_AUTOCOMPLETE_LIMIT", "5"))
+
+# Instrumentación (panel de depuración y exportación de métricas)
+DEBUG_PANEL = os.environ.get("RECOMMENDER_DEBUG", "0") == "1"
+METRICS_JSONL_PATH = os.environ.get("RECOMMENDER_METRICS_JSONL", "")
+METRICS_PROM_PATH = os.environ.get("RECOMMENDER_METRICS_PROM", "")
+METRICS_PROM_INTERVAL = float(os.environ.get("RECOMMENDER_METRICS_PROM_INTERVAL", "10"))
+
+# Precarga especulativa de los siguientes niveles
+PREFETCH_ENABLED = os.environ.get("RECOMMENDER_PREFETCH", "0") == "1"
+PREFETCH_MAX_WORKERS = int(os.environ.get("RECOMMENDER_PREFETCH_WORKERS", "8"))
+PREFETCH_TOP_N = int(os.environ.get("RECOMMENDER_PREFETCH_TOP_N", "10"))
+
+# Cliente por lotes (/recommend/batch con alternativa de peticiones concurrentes)
+BATCH_MAX_SIZE = int(os.environ.get("RECOMMENDER_BATCH_MAX_SIZE", "50"))
+BATCH_FALLBACK_WORKERS = int(os.environ.get("RECOMMENDER_BATCH_FALLBACK_WORKERS", "8"))
+
+# Recomendaciones progresivas (NDJSON/SSE en /recommend/stream)
+STREAM_ENABLED = os.environ.get("RECOMMENDER_STREAM", "1") == "1"
+
+# Gráficos de similitud memoizados
+CHART_CACHE_MAX_ENTRIES = int(os.environ.get("RECOMMENDER_CHART_CACHE_MAX_ENTRIES", "256"))
+CHART_MAX_BARS = int(os.environ.get("RECOMMENDER_CHART_MAX_BARS", "50"))
+# Los gráficos van en desplegables que se calculan al abrirlos; "1" los abre de inicio
+CHARTS_EXPANDED = os.environ.get("RECOMMENDER_CHARTS_EXPANDED", "0") == "1"
+
+# Tarjetas paginadas (la tabla interactiva siempre muestra todas las filas)
+CARDS_PAGE_SIZE = int(os.environ.get("RECOMMENDER_CARDS_PAGE_SIZE", "10"))
+CARDS_PAGE_SIZE_OPTIONS = sorted({5, 10, 20, 50, CARDS_PAGE_SIZE})
+
+# Grafo de exploración (niveles, nodos y memoria acotados por sesión)
+EXPLORATION_MAX_NODES = int(os.environ.get("RECOMMENDER_EXPLORATION_MAX_NODES", "50"))
+SESSION_MEMORY_BUDGET = int(float(os.environ.get("RECOMMENDER_SESSION_BUDGET_KB", "2048")) * 1024)
 
 # Inicializar session_state
-if 'current_data' not in st.session_state:
-    st.session_state.current_data = None
-if 'recursion_level' not in st.session_state:
-    st.session_state.recursion_level = 0
+def init_session_state():
+    """Valores por defecto de la sesión (se ejecuta al principio de cada ejecución)"""
+    if 'pending_search' not in st.session_state:
+        st.session_state.pending_search = None  # (song_name, artist_name) elegida entre sugerencias
+    if 'debug_panel' not in st.session_state:
+        st.session_state.debug_panel = DEBUG_PANEL
+    if 'graph' not in st.session_state:
+        st.session_state.graph = None  # ExplorationGraph de la búsqueda actual
+    if 'recursion_level' not in st.session_state:
+        st.session_state.recursion_level = 0
+    if 'prefetch_enabled' not in st.session_state:
+        st.session_state.prefetch_enabled = PREFETCH_ENABLED
+    if 'prefetch_batch' not in st.session_state:
+        st.session_state.prefetch_batch = None
+    if 'cards_page_size' not in st.session_state:
+        st.session_state.cards_page_size = CARDS_PAGE_SIZE
+    if 'streaming_enabled' not in st.session_state:
+        st.session_state.streaming_enabled = STREAM_ENABLED
+    if 'partial_error' not in st.session_state:
+        st.session_state.partial_error = None  # error de un streaming cortado a medias
 
 # ==========================================
 # ESTILOS CSS CON EFECTOS 3D
 # ==========================================
-st.markdown("""
+CUSTOM_CSS = """
     <style>
     .main-title {
         text-align: center;
@@ -105,82 +258,1647 @@ st.markdown("""
             inset 0 1px 0 rgba(255,255,255,0.5);
     }
     </style>
-""", unsafe_allow_html=True)
+"""
 
 # ==========================================
-# FUNCIONES AUXILIARES
+# CACHÉ DE RESPUESTAS
 # ==========================================
-def get_recommendations(song_name, artist_name=""):
-    """Función para obtener recomendaciones de la API"""
+class ResponseCache:
+    """Caché LRU con TTL, limitada por número de entradas y por bytes"""
+
+    def __init__(self, max_entries, max_bytes, ttl, negative_ttl):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.evictions = 0
+        self._bytes = 0
+        self._entries = OrderedDict()  # key -> (expires_at, size, data, error)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Devuelve (data, error) si la entrada existe y no ha caducado, si no None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            if entry[2] is None:
+                self.negative_hits += 1
+            return entry[2], entry[3]
+
+    def contains(self, key):
+        """Comprueba si hay una entrada vigente sin contarla como acierto o fallo"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] > time.monotonic()
+
+    def put(self, key, data, error=None, size=0):
+        """Guarda una respuesta; las negativas (data=None) usan el TTL corto"""
+        ttl = self.ttl if data is not None else self.negative_ttl
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, size, data, error)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "negative_hits": self.negative_hits,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry[1]
+
+
+def normalize_seed(song_name, artist_name=""):
+    """Clave normalizada (sin mayúsculas ni espacios sobrantes) para una semilla"""
+    return (
+        " ".join((song_name or "").split()).casefold(),
+        " ".join((artist_name or "").split()).casefold(),
+    )
+
+@st.cache_resource
+def get_response_cache():
+    """Caché de respuestas compartida por todas las sesiones del proceso"""
+    return ResponseCache(CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, CACHE_TTL, CACHE_NEGATIVE_TTL)
+
+# ==========================================
+# MÉTRICAS
+# ==========================================
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+class Histogram:
+    """Histograma acumulativo al estilo Prometheus más una muestra reciente para percentiles"""
+
+    def __init__(self, buckets, sample_size=2048):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=sample_size)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.recent.append(value)
+
+    def quantile(self, q):
+        if not self.recent:
+            return None
+        values = sorted(self.recent)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+class MetricsRegistry:
+    """Contadores e histogramas del proceso, exportables en formato de texto de Prometheus"""
+
+    def __init__(self):
+        self.counters = {}  # (nombre, etiquetas) -> valor
+        self.histograms = {}  # (nombre, etiquetas) -> Histogram
+        self.help = {}
+        self._lock = threading.Lock()
+        # Ejecución en curso de cada hilo (Streamlit ejecuta cada sesión en su hilo)
+        self._local = threading.local()
+        # Serializa la escritura de ficheros (sin bloquear a quien solo registra métricas)
+        self._export_lock = threading.Lock()
+        self._prom_written_at = 0.0
+
+    def inc(self, name, labels=(), value=1, help_text=""):
+        key = (name, tuple(labels))
+        with self._lock:
+            self.help.setdefault(name, help_text)
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=(), buckets=LATENCY_BUCKETS, help_text=""):
+        key = (name, tuple(labels))
+        with self._lock:
+            self.help.setdefault(name, help_text)
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def quantile(self, name, q, labels=()):
+        with self._lock:
+            histogram = self.histograms.get((name, tuple(labels)))
+            return histogram.quantile(q) if histogram else None
+
+    # --- Registro de una ejecución del script (o de un fragmento) ---
+    def begin_rerun(self, kind="full"):
+        self._local.record = {
+            "kind": kind,
+            "started_at": time.time(),
+            "_t0": time.perf_counter(),
+            "phases": [],
+            "requests": [],
+        }
+        return self._local.record
+
+    def current_rerun(self):
+        return getattr(self._local, "record", None)
+
+    def end_rerun(self):
+        record = self.current_rerun()
+        if record is None:
+            return None
+        self._local.record = None
+        record["total_ms"] = (time.perf_counter() - record.pop("_t0")) * 1000.0
+        self.observe("recommender_rerun_seconds", record["total_ms"] / 1000.0,
+                     (("kind", record["kind"]),), help_text="Duración de cada ejecución del script")
+        return record
+
+    @contextmanager
+    def phase(self, name, level=None):
+        """Mide una fase de la ejecución actual (fetch, normalize, cards, table, chart...)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            level_label = "" if level is None else (str(level) if level < 5 else "5+")
+            self.observe("recommender_phase_seconds", elapsed,
+                         (("phase", name), ("level", level_label)),
+                         help_text="Duración de cada fase de la interfaz")
+            record = self.current_rerun()
+            if record is not None:
+                record["phases"].append({"phase": name, "level": level, "ms": elapsed * 1000.0})
+
+    def record_request(self, endpoint, status, elapsed, size):
+        labels = (("endpoint", endpoint), ("status", str(status)))
+        self.inc("recommender_http_requests_total", labels, help_text="Peticiones HTTP a la API")
+        self.observe("recommender_http_request_seconds", elapsed, labels,
+                     help_text="Latencia de las peticiones HTTP a la API")
+        if size is not None:
+            self.observe("recommender_http_response_bytes", size, (("endpoint", endpoint),),
+                         buckets=SIZE_BUCKETS, help_text="Tamaño de las respuestas de la API")
+        record = self.current_rerun()
+        if record is not None:
+            record["requests"].append({"endpoint": endpoint, "status": status,
+                                       "ms": elapsed * 1000.0, "bytes": size})
+
+    # --- Exportación ---
+    def to_prometheus(self, gauges=None):
+        """Texto en el formato de exposición de Prometheus"""
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+            for name in sorted({key[0] for key, _ in counters}):
+                lines.append(f"# HELP {name} {self.help.get(name, '')}")
+                lines.append(f"# TYPE {name} counter")
+                for (metric, labels), value in counters:
+                    if metric == name:
+                        lines.append(f"{name}{_prom_labels(labels)} {value}")
+            for name in sorted({key[0] for key, _ in histograms}):
+                lines.append(f"# HELP {name} {self.help.get(name, '')}")
+                lines.append(f"# TYPE {name} histogram")
+                for (metric, labels), histogram in histograms:
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{name}_bucket{_prom_labels(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{_prom_labels(labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{_prom_labels(labels)} {histogram.count}")
+        for name, value in sorted((gauges or {}).items()):
+            # Los acumulados (sufijo _total, p. ej. aciertos de caché) son contadores
+            lines.append(f"# TYPE {name} {'counter' if name.endswith('_total') else 'gauge'}")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, record, gauges=None):
+        """Escribe la ejecución en el JSONL y, cada cierto tiempo, el fichero de Prometheus
+
+        Un fallo de escritura se registra en el log; nunca llega a la página.
+        """
+        try:
+            with self._export_lock:
+                if METRICS_JSONL_PATH and record is not None:
+                    with open(METRICS_JSONL_PATH, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                now = time.monotonic()
+                if METRICS_PROM_PATH and now - self._prom_written_at >= METRICS_PROM_INTERVAL:
+                    self._prom_written_at = now
+                    _write_atomic(METRICS_PROM_PATH, self.to_prometheus(gauges))
+        except Exception:
+            logger.warning("No se pudieron exportar las métricas", exc_info=True)
+
+def _write_atomic(path, text):
+    """Escribe en un temporal propio del mismo directorio y lo renombra sobre `path`"""
+    directory, filename = os.path.split(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{filename}.", suffix=".tmp", dir=directory)
     try:
-        response = requests.post(
-            API_URL,
-            json={
-                "song_name": song_name,
-                "artist_name": artist_name
-            },
-            timeout=10
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        # mkstemp crea el fichero solo legible por su dueño; el recolector puede ser otro usuario
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def _prom_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), chr(92) + "n")}"'
+        for key, value in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+@st.cache_resource
+def get_metrics():
+    """Registro de métricas compartido por todas las sesiones del proceso"""
+    return MetricsRegistry()
+
+def finish_rerun():
+    """Cierra la medición de la ejecución actual, la guarda en la sesión y la exporta"""
+    metrics = get_metrics()
+    record = metrics.end_rerun()
+    if record is not None:
+        st.session_state.last_rerun_metrics = record
+        metrics.export(record, cache_gauges())
+    return record
+
+@contextmanager
+def measured_rerun(kind="full"):
+    """Mide una ejecución del script o de un fragmento y la cierra siempre
+
+    st.rerun(), st.stop() o una excepción a mitad también la cierran: si no, el
+    registro quedaría abierto en el hilo y las siguientes ejecuciones de
+    fragmentos en él no se medirían.
+    """
+    record = get_metrics().begin_rerun(kind)
+    try:
+        yield record
+    finally:
+        finish_rerun()
+
+def cache_gauges():
+    stats = get_response_cache().stats()
+    payloads = get_payload_store().stats()
+    frames = get_frame_cache().stats()
+    return {
+        "recommender_cache_entries": stats["entries"],
+        "recommender_cache_bytes": stats["bytes"],
+        "recommender_cache_hits_total": stats["hits"],
+        "recommender_cache_misses_total": stats["misses"],
+        "recommender_payload_store_entries": payloads["entries"],
+        "recommender_payload_store_references": payloads["references"],
+        "recommender_payload_store_bytes": payloads["bytes"],
+        "recommender_frame_cache_entries": frames["entries"],
+        "recommender_frame_cache_bytes": frames["bytes"],
+    }
+
+# ==========================================
+# FORMATOS DE RESPUESTA
+# ==========================================
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+JSON_MEDIA_TYPE = "application/json"
+
+def response_media_types(formats=RESPONSE_FORMATS):
+    """Tipos MIME aceptados, por preferencia, limitados a los que se pueden decodificar"""
+    available = {
+        "arrow": ARROW_MEDIA_TYPE if pa is not None else None,
+        "msgpack": MSGPACK_MEDIA_TYPE if msgpack is not None else None,
+        "json": JSON_MEDIA_TYPE,
+    }
+    media_types = [available[fmt] for fmt in formats if available.get(fmt)]
+    # Los servidores antiguos solo hablan JSON: siempre como última opción
+    if JSON_MEDIA_TYPE not in media_types:
+        media_types.append(JSON_MEDIA_TYPE)
+    return media_types
+
+def accept_header(media_types):
+    """Cabecera Accept con calidades decrecientes en el orden dado"""
+    return ", ".join(
+        media_type if i == 0 else f"{media_type};q={max(0.1, 1.0 - i / 10):.1f}"
+        for i, media_type in enumerate(media_types)
+    )
+
+class RecordsView(Sequence):
+    """Recomendaciones columnares vistas como una lista de dicts, sin convertirlas
+
+    Las filas se materializan solo al pedirlas (p. ej. la seleccionada); la
+    normalización usa directamente `frame`.
+    """
+
+    __slots__ = ('frame',)
+
+    def __init__(self, frame):
+        self.frame = frame
+
+    def __len__(self):
+        return len(self.frame)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.frame.iloc[index].to_dict('records')
+        if index < 0:
+            index += len(self.frame)
+        if not 0 <= index < len(self.frame):
+            raise IndexError(index)
+        return self.frame.iloc[index:index + 1].to_dict('records')[0]
+
+    def __iter__(self):
+        return iter(self.frame.to_dict('records'))
+
+    def to_frame(self):
+        return self.frame.copy(deep=False)
+
+def decode_recommendations(response):
+    """Payload de /recommend según el Content-Type que haya elegido el servidor"""
+    media_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+    if media_type == ARROW_MEDIA_TYPE and pa is not None:
+        # Tabla de recomendaciones en Arrow IPC; la canción encontrada va en los metadatos
+        table = pa.ipc.open_stream(response.content).read_all()
+        metadata = table.schema.metadata or {}
+        return {
+            "song_found": json.loads(metadata.get(b"song_found", b"null")),
+            "recommendations": RecordsView(table.to_pandas(split_blocks=True, self_destruct=True)),
+        }
+    if media_type in (MSGPACK_MEDIA_TYPE, "application/x-msgpack") and msgpack is not None:
+        payload = msgpack.unpackb(response.content)
+        # Columnar ({columna: [valores]}) o, en servidores que no lo hagan, lista de registros
+        if isinstance(payload.get("recommendations"), dict):
+            payload["recommendations"] = RecordsView(pd.DataFrame(payload["recommendations"]))
+        return payload
+    return response.json()
+
+# ==========================================
+# ALMACÉN DE RESPUESTAS COMPARTIDAS
+# ==========================================
+class CompactRecords(Sequence):
+    """Recomendaciones por columnas: textos internados y números en `array`
+
+    Los nombres, artistas y tipos se repiten mucho entre respuestas; con
+    `sys.intern` todas comparten el mismo objeto. Las columnas numéricas sin
+    huecos se guardan en `array('d')` / `array('q')` (8 bytes por valor) y el
+    resto en tuplas. Las filas se materializan solo al pedirlas.
+    """
+
+    __slots__ = ('columns', 'length', 'nbytes')
+
+    def __init__(self, columns, length):
+        self.columns = columns  # nombre -> array o tupla
+        self.length = length
+        self.nbytes = sum(_column_nbytes(values) for values in columns.values())
+
+    @classmethod
+    def from_records(cls, records):
+        if isinstance(records, RecordsView):
+            # Columnas de la respuesta Arrow/msgpack: se copian sus buffers sin pasar por listas
+            frame = records.frame
+            return cls({name: _compact_series(frame[name]) for name in frame.columns}, len(frame))
+        raw = {name: [rec.get(name) for rec in records]
+               for name in dict.fromkeys(name for rec in records for name in rec)}
+        return cls({name: _compact_column(values) for name, values in raw.items()}, len(records))
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.length))]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError(index)
+        return {name: values[index] for name, values in self.columns.items()}
+
+    def to_frame(self):
+        """DataFrame sin copiar las columnas numéricas (vistas de solo lectura)
+
+        `copy=False` hace falta: con un dict, pandas copia cada columna por defecto.
+        """
+        return pd.DataFrame({
+            name: _readonly_view(values) if isinstance(values, array) else list(values)
+            for name, values in self.columns.items()
+        }, copy=False)
+
+def _readonly_view(values):
+    view = np.frombuffer(values, dtype=np.float64 if values.typecode == 'd' else np.int64)
+    # La respuesta la comparten todas las sesiones: nadie debe escribir en ella
+    view.flags.writeable = False
+    return view
+
+def _compact_column(values):
+    kinds = {type(value) for value in values}
+    if kinds <= {str, type(None)}:
+        return tuple(sys.intern(value) if value is not None else None for value in values)
+    if kinds == {int}:
+        try:
+            return array('q', values)
+        except OverflowError:
+            return tuple(values)
+    if kinds <= {int, float} and kinds:
+        return array('d', values)
+    # Huecos (None) o tipos mezclados: se conservan tal cual
+    return tuple(values)
+
+def _compact_series(series):
+    """Como _compact_column, pero desde una columna de pandas sin pasar por listas
+
+    Los números se copian de golpe del buffer de numpy al `array`; los textos
+    respaldados por Arrow se codifican como diccionario, así que solo se crea
+    (e interna) un str por valor distinto.
+    """
+    dtype = series.dtype
+    if isinstance(dtype, np.dtype) and dtype.kind in "fi":
+        typecode, numpy_type = ('d', np.float64) if dtype.kind == "f" else ('q', np.int64)
+        return array(typecode, np.ascontiguousarray(series.values, dtype=numpy_type).tobytes())
+    if isinstance(dtype, pd.StringDtype) and dtype.storage == "pyarrow":
+        encoded = pa.array(series.array).dictionary_encode()
+        # El índice nulo (-1) cae en el None del final
+        table = np.array([sys.intern(value) for value in encoded.dictionary.to_pylist()] + [None], dtype=object)
+        return tuple(table[encoded.indices.fill_null(-1).to_numpy()])
+    # Textos en object, booleanos, enteros sin signo o tipos mezclados
+    return _compact_column(list(series.to_numpy(dtype=object)))
+
+def _column_nbytes(values):
+    if isinstance(values, array):
+        return values.itemsize * len(values)
+    # Los textos internados se comparten entre respuestas: cuentan una vez por columna
+    return sys.getsizeof(values) + sum(sys.getsizeof(value) for value in set(values) if isinstance(value, str))
+
+def compact_payload(data):
+    """Respuesta con las recomendaciones en CompactRecords (idempotente)"""
+    if data is None or isinstance(data.get('recommendations'), CompactRecords):
+        return data
+    compact = dict(data)
+    compact['recommendations'] = CompactRecords.from_records(data.get('recommendations') or [])
+    return compact
+
+def payload_nbytes(data):
+    return data['recommendations'].nbytes + sys.getsizeof(data.get('song_found') or {})
+
+class PayloadStore:
+    """Respuestas referenciadas por las sesiones, una sola copia por semilla en todo el proceso
+
+    Cada entrada cuenta cuántos grafos de exploración la usan y desaparece al
+    soltarla el último (la caché de respuestas puede seguir guardándola).
+    """
+
+    def __init__(self):
+        self._entries = {}  # key -> [payload, referencias]
+        self._lock = threading.Lock()
+
+    def acquire(self, key, data):
+        """Registra una referencia a `key` y devuelve la copia compartida de su respuesta"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = [compact_payload(data), 0]
+            entry[1] += 1
+            return entry[0]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[0] if entry is not None else None
+
+    def release(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self._entries[key]
+
+    def release_many(self, keys):
+        for key in list(keys):
+            self.release(key)
+
+    def stats(self):
+        with self._lock:
+            entries = list(self._entries.values())
+        return {
+            "entries": len(entries),
+            "references": sum(refs for _, refs in entries),
+            "bytes": sum(payload_nbytes(payload) for payload, _ in entries),
+        }
+
+@st.cache_resource
+def get_payload_store():
+    """Almacén de respuestas compartido por todas las sesiones del proceso"""
+    return PayloadStore()
+
+# ==========================================
+# BALANCEO ENTRE RÉPLICAS
+# ==========================================
+class NoReplicaAvailable(requests.exceptions.ConnectionError):
+    """Todas las réplicas tienen el disyuntor abierto (o ya se han probado)"""
+
+class Replica:
+    """Réplica de la API: peticiones en curso y disyuntor (cerrado, abierto o semiabierto)"""
+
+    def __init__(self, url, probe=None, failure_threshold=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN):
+        self.url = url
+        self.probe = probe
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.outstanding = 0
+        self.failures = 0  # fallos consecutivos
+        self.opened_at = None  # momento (monotonic) en que se abrió el disyuntor
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def breaker(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def healthy(self):
+        """La sonda no la ve caída; solo sirve para ordenar, nunca para excluir
+
+        La sonda consulta "/", que puede fallar aunque /recommend funcione; quien
+        excluye una réplica es el disyuntor, que ve las peticiones reales.
+        """
+        return self.probe is None or self.probe.state not in ("down", "error")
+
+    def available(self):
+        """El disyuntor deja pasar la petición"""
+        breaker = self.breaker
+        # Semiabierto: una única petición de prueba decide si se cierra
+        return breaker == "closed" or (breaker == "half_open" and not self.trial_in_flight)
+
+    def try_acquire(self):
+        """Reserva una petición si la réplica está disponible, en un solo paso atómico
+
+        Devuelve None si no lo está, "trial" si es la petición de prueba del
+        disyuntor semiabierto (solo una a la vez) y "normal" en otro caso.
+        """
+        with self._lock:
+            breaker = self.breaker
+            if breaker == "open" or (breaker == "half_open" and self.trial_in_flight):
+                return None
+            self.outstanding += 1
+            if breaker == "half_open":
+                self.trial_in_flight = True
+                return "trial"
+            return "normal"
+
+    def release(self, ok, trial=False):
+        """Cierra la petición; devuelve True si el disyuntor acaba de abrirse"""
+        with self._lock:
+            self.outstanding -= 1
+            if trial:
+                self.trial_in_flight = False
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+                return False
+            self.failures += 1
+            # Un fallo en semiabierto vuelve a abrirlo sin esperar al umbral
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def snapshot(self):
+        return {
+            "url": self.url,
+            "health": self.probe.state if self.probe is not None else None,
+            "breaker": self.breaker,
+            "outstanding": self.outstanding,
+            "failures": self.failures,
+        }
+
+class ReplicaPool:
+    """Reparte peticiones entre réplicas con "power of two choices" sobre las pendientes"""
+
+    def __init__(self, replicas):
+        self.replicas = replicas
+        self.latency = Histogram(LATENCY_BUCKETS, sample_size=512)
+        self._rng = random.Random()
+        self._lock = threading.Lock()
+
+    def choose(self, exclude=()):
+        """Réplica disponible con menos peticiones en curso de dos elegidas al azar
+
+        Se prefieren las réplicas que la sonda ve sanas; si no hay ninguna se
+        prueba igualmente con las demás (solo el disyuntor excluye). Devuelve
+        (réplica, lease) con la petición ya reservada en la réplica
+        (Replica.try_acquire); hay que cerrarla con release(ok, lease == "trial").
+        """
+        candidates = [r for r in self.replicas if r not in exclude and r.available()]
+        while candidates:
+            preferred = [r for r in candidates if r.healthy()] or candidates
+            if len(preferred) == 1:
+                replica = preferred[0]
+            else:
+                first, second = self._rng.sample(preferred, 2)
+                replica = first if first.outstanding <= second.outstanding else second
+            # Otra petición puede haberse llevado la prueba del semiabierto entretanto
+            lease = replica.try_acquire()
+            if lease is not None:
+                return replica, lease
+            candidates.remove(replica)
+        raise NoReplicaAvailable("No hay ninguna réplica de la API disponible")
+
+    def observe(self, seconds):
+        """Latencia de una respuesta correcta (alimenta el retardo del hedging)"""
+        with self._lock:
+            self.latency.observe(seconds)
+
+    def hedge_delay(self):
+        """Espera antes de duplicar una petición: el p95 reciente, acotado"""
+        with self._lock:
+            enough = len(self.latency.recent) >= HEDGE_MIN_SAMPLES
+            delay = self.latency.quantile(HEDGE_QUANTILE) if enough else None
+        if delay is None:
+            return HEDGE_INITIAL_DELAY
+        return min(max(delay, HEDGE_MIN_DELAY), API_READ_TIMEOUT)
+
+    def snapshot(self):
+        return [replica.snapshot() for replica in self.replicas]
+
+class HedgeBudget:
+    """Limita los duplicados a una fracción de las peticiones
+
+    Cada petición aporta `ratio` y cada duplicado cuesta 1; el saldo se acota
+    en `burst` para que un periodo tranquilo no permita luego una avalancha.
+    """
+
+    def __init__(self, ratio=HEDGE_BUDGET, burst=HEDGE_BUDGET_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self.balance = 0.0
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.balance = min(self.burst, self.balance + self.ratio)
+
+    def withdraw(self):
+        """True si queda saldo para un duplicado (y lo descuenta)"""
+        with self._lock:
+            # Margen para el error de redondeo al sumar `ratio` (10 × 0.1 < 1.0)
+            if self.balance < 1.0 - 1e-9:
+                return False
+            self.balance -= 1.0
+            return True
+
+def _is_failure(outcome):
+    """Excepción de red o error del servidor: se prueba otra réplica"""
+    return isinstance(outcome, Exception) or outcome.status_code >= 500
+
+# ==========================================
+# FUNCIONES AUXILIARES
+# ==========================================
+@st.cache_resource
+def get_http_session():
+    """Sesión HTTP compartida por todas las sesiones de Streamlit del proceso"""
+    # /recommend es una consulta de solo lectura, así que reintentar el POST es seguro
+    retry = Retry(
+        total=API_MAX_RETRIES,
+        connect=API_MAX_RETRIES,
+        read=API_MAX_RETRIES,
+        status=API_MAX_RETRIES,
+        backoff_factor=API_RETRY_BACKOFF,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD", "POST"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=len(API_REPLICA_URLS),
+        pool_maxsize=API_POOL_SIZE,
+        # Con varias réplicas el reintento es pasar a otra (o el hedging), no insistir en la misma
+        max_retries=retry if len(API_REPLICA_URLS) == 1 else 0,
+        pool_block=False,
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    # Anunciar todas las codificaciones que urllib3 sabe descomprimir (zstd/br si están instaladas)
+    session.headers.update({
+        "Connection": "keep-alive",
+        "Accept-Encoding": make_headers(accept_encoding=True)["accept-encoding"],
+    })
+    return session
+
+class RecommendationClient:
+    """Cliente de la API de recomendaciones compartido por todas las sesiones"""
+
+    def __init__(self, session, cache, pool=None, metrics=None):
+        self.session = session
+        self.cache = cache
+        self.pool = pool if pool is not None else ReplicaPool([Replica(url) for url in API_REPLICA_URLS])
+        self.metrics = metrics
+        self.timeout = (API_CONNECT_TIMEOUT, API_READ_TIMEOUT)
+        self.accept = accept_header(response_media_types())
+        # None = sin comprobar; se fija al primer intento contra /recommend/batch
+        self.supports_batch = None
+        # Igual para /recommend/stream
+        self.supports_stream = None
+        self._fallback_executor = ThreadPoolExecutor(
+            max_workers=BATCH_FALLBACK_WORKERS, thread_name_prefix="batch-fallback"
         )
-        
-        if response.status_code == 200:
-            return response.json(), None
-        elif response.status_code == 404:
-            return None, f"❌ {response.json()['detail']}"
-        elif response.status_code == 503:
-            return None, "⚠️ El servicio no está disponible. Verifica que la API esté corriendo."
+        # Cada intento con hedging se ejecuta aquí para poder esperarlo con un límite
+        self._hedge_executor = ThreadPoolExecutor(
+            max_workers=API_POOL_SIZE, thread_name_prefix="hedge"
+        )
+        # Hilos del executor ocupados o reservados: nunca se encola una petición en él
+        self._hedge_slots = API_POOL_SIZE
+        self._hedge_in_flight = 0
+        self._hedge_lock = threading.Lock()
+        self.hedge_budget = HedgeBudget()
+
+    def recommend(self, song_name, artist_name=""):
+        """Devuelve (data, error) para una semilla, usando la caché si es posible"""
+        # Las respuestas se comparten entre sesiones: no modificar `data` en el llamador
+        key = normalize_seed(song_name, artist_name)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        try:
+            response = self._post(
+                "/recommend",
+                json={
+                    "song_name": song_name,
+                    "artist_name": artist_name
+                },
+                headers={"Accept": self.accept}
+            )
+            
+            if response.status_code == 200:
+                data = compact_payload(decode_recommendations(response))
+                self.cache.put(key, data, size=len(response.content))
+                return data, None
+            elif response.status_code == 404:
+                error = _error_for_status(404, response.json()['detail'])
+                self.cache.put(key, None, error, size=len(response.content))
+                return None, error
+            else:
+                return None, _error_for_status(response.status_code)
+        except Exception as e:
+            return None, _error_for_exception(e)
+
+    def _post(self, endpoint, stream=False, hedge=True, **kwargs):
+        """POST a una réplica de la API, pasando a otra si falla (red o 5xx)
+
+        Con `hedge` (y sin streaming), si la respuesta tarda más que el p95
+        reciente se lanza un duplicado en otra réplica y se usa la primera que
+        responda bien.
+        """
+        tried = []
+        outcome = None
+        while len(tried) < len(self.pool.replicas):
+            try:
+                replica, lease = self.pool.choose(exclude=tried)
+            except NoReplicaAvailable:
+                if outcome is None:
+                    raise
+                break
+            tried.append(replica)
+            if stream or not hedge or not HEDGE_ENABLED or len(self.pool.replicas) == 1:
+                outcome = self._attempt(replica, lease, endpoint, stream, kwargs)
+            else:
+                outcome = self._hedged(replica, lease, endpoint, kwargs, tried)
+            if not _is_failure(outcome):
+                return outcome
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def _attempt(self, replica, lease, endpoint, stream, kwargs):
+        """Una petición a una réplica; devuelve la respuesta o la excepción (sin lanzarla)
+
+        `lease` es la reserva hecha por ReplicaPool.choose. Registra latencia,
+        código y tamaño de la respuesta y el resultado en el disyuntor de la
+        réplica.
+        """
+        started = time.perf_counter()
+        try:
+            outcome = self.session.post(
+                f"{replica.url}{endpoint}", timeout=self.timeout, stream=stream, **kwargs
+            )
+        except Exception as e:
+            outcome = e
+        elapsed = time.perf_counter() - started
+        failed = _is_failure(outcome)
+        if replica.release(ok=not failed, trial=lease == "trial") and self.metrics is not None:
+            self.metrics.inc("recommender_breaker_opened_total", (("replica", replica.url),),
+                             help_text="Veces que se abrió el disyuntor de una réplica")
+        if not failed and not stream:
+            self.pool.observe(elapsed)
+        if self.metrics is not None:
+            if isinstance(outcome, Exception):
+                self.metrics.record_request(endpoint, type(outcome).__name__, elapsed, None)
+            else:
+                # En streaming se mide hasta las cabeceras; el tamaño no se conoce todavía
+                size = None if stream else len(outcome.content)
+                self.metrics.record_request(endpoint, outcome.status_code, elapsed, size)
+        return outcome
+
+    def _hedged(self, primary, lease, endpoint, kwargs, tried):
+        """Petición a `primary` con un duplicado en otra réplica si tarda demasiado
+
+        El retardo se cuenta desde que empieza la petición, no desde que se
+        encola, y sin hilos libres en el executor o sin presupuesto de hedging
+        no se duplica nada: la petición va sola en el hilo del llamador.
+        """
+        self.hedge_budget.deposit()
+        if not self._reserve_hedge_slot():
+            self._count_hedge_skipped(endpoint, "saturated")
+            return self._attempt(primary, lease, endpoint, False, kwargs)
+        started = threading.Event()
+        first = self._hedge_executor.submit(self._run_hedge_slot, started, primary, lease, endpoint, kwargs)
+        started.wait()
+        try:
+            return first.result(timeout=self.pool.hedge_delay())
+        except FutureTimeoutError:
+            pass
+        if not self._reserve_hedge_slot():
+            self._count_hedge_skipped(endpoint, "saturated")
+            return first.result()
+        if not self.hedge_budget.withdraw():
+            self._release_hedge_slot()
+            self._count_hedge_skipped(endpoint, "budget")
+            return first.result()
+        try:
+            backup, backup_lease = self.pool.choose(exclude=tried)
+        except NoReplicaAvailable:
+            self._release_hedge_slot()
+            return first.result()
+        tried.append(backup)
+        if self.metrics is not None:
+            self.metrics.inc("recommender_hedged_requests_total", (("endpoint", endpoint),),
+                             help_text="Peticiones duplicadas en otra réplica por tardar más que el p95")
+        second = self._hedge_executor.submit(
+            self._run_hedge_slot, threading.Event(), backup, backup_lease, endpoint, kwargs
+        )
+        pending = {first, second}
+        outcome = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                outcome = future.result()
+                if not _is_failure(outcome):
+                    # La otra petición termina en segundo plano y su respuesta se descarta
+                    return outcome
+        return outcome
+
+    def _reserve_hedge_slot(self):
+        with self._hedge_lock:
+            if self._hedge_in_flight >= self._hedge_slots:
+                return False
+            self._hedge_in_flight += 1
+            return True
+
+    def _release_hedge_slot(self):
+        with self._hedge_lock:
+            self._hedge_in_flight -= 1
+
+    def _run_hedge_slot(self, started, replica, lease, endpoint, kwargs):
+        """Intento en un hilo del executor ya reservado; libera la reserva al acabar"""
+        started.set()
+        try:
+            return self._attempt(replica, lease, endpoint, False, kwargs)
+        finally:
+            self._release_hedge_slot()
+
+    def _count_hedge_skipped(self, endpoint, reason):
+        if self.metrics is not None:
+            self.metrics.inc("recommender_hedge_skipped_total", (("endpoint", endpoint), ("reason", reason)),
+                             help_text="Duplicados no lanzados por falta de hilos o de presupuesto")
+
+    def recommend_stream(self, song_name, artist_name=""):
+        """Genera eventos (tipo, valor) a medida que llega la respuesta
+
+        Tipos: "song_found", "recommendation", "error" y por último "done" con el
+        payload completo, que queda en la caché. Solo se da por completo si llega
+        el evento "end" (con tantas recomendaciones como anuncia su `count`); si
+        no, "partial" lleva lo recibido hasta entonces justo antes del "error". Si la
+        respuesta ya está en caché o el servidor no admite streaming, se emiten
+        los eventos de la llamada normal.
+        """
+        key = normalize_seed(song_name, artist_name)
+        if self.supports_stream is False or self.cache.contains(key):
+            yield from self._replay(*self.recommend(song_name, artist_name))
+            return
+
+        try:
+            response = self._post(
+                "/recommend/stream",
+                json={
+                    "song_name": song_name,
+                    "artist_name": artist_name
+                },
+                headers={"Accept": f"{NDJSON_MEDIA_TYPES[0]}, {SSE_MEDIA_TYPE}"},
+                stream=True
+            )
+        except Exception as e:
+            yield "error", _error_for_exception(e)
+            return
+
+        with response:
+            # "Not Found" es la respuesta de FastAPI para una ruta inexistente
+            if response.status_code in (405, 501) or (
+                response.status_code == 404 and _json_or_empty(response).get('detail') == "Not Found"
+            ):
+                self.supports_stream = False
+                yield from self._replay(*self.recommend(song_name, artist_name))
+                return
+            if response.status_code != 200:
+                error = _error_for_status(response.status_code, _json_or_empty(response).get('detail'))
+                if response.status_code == 404:
+                    self.cache.put(key, None, error, size=len(response.content))
+                yield "error", error
+                return
+
+            parse = stream_parser(response.headers.get("Content-Type"))
+            if parse is None:
+                # Un 200 que no es un flujo (p. ej. un proxy que devuelve JSON): llamada normal
+                self.supports_stream = False
+                yield from self._replay(*self.recommend(song_name, artist_name))
+                return
+
+            self.supports_stream = True
+            data = {"song_found": None, "recommendations": []}
+            end = None
+            size = 0
+            try:
+                for payload in parse(response.iter_lines()):
+                    size += len(payload)
+                    event = json.loads(payload)
+                    if event.get("type") == "song_found":
+                        data["song_found"] = event["data"]
+                        yield "song_found", event["data"]
+                    elif event.get("type") == "recommendation":
+                        data["recommendations"].append(event["data"])
+                        yield "recommendation", event["data"]
+                    elif event.get("type") == "end":
+                        end = event
+                        break
+            except Exception as e:
+                error = _error_for_exception(e)
+            else:
+                # Un cierre limpio antes del evento final también es una respuesta cortada
+                error = _incomplete_stream_error(data, end)
+            if error is not None:
+                # Lo recibido hasta el fallo se conserva (sin guardarlo en la caché)
+                if data["song_found"] is not None and data["recommendations"]:
+                    yield "partial", compact_payload(data)
+                yield "error", error
+                return
+
+        if self.metrics is not None:
+            self.metrics.observe("recommender_http_response_bytes", size,
+                                 (("endpoint", "/recommend/stream"),), buckets=SIZE_BUCKETS)
+        data = compact_payload(data)
+        self.cache.put(key, data, size=size)
+        yield "done", data
+
+    def _replay(self, data, error):
+        """Eventos de streaming equivalentes a una respuesta completa"""
+        if data is None:
+            yield "error", error
+            return
+        yield "song_found", data['song_found']
+        for rec in data['recommendations']:
+            yield "recommendation", rec
+        yield "done", data
+
+    def recommend_batch(self, seeds):
+        """Recomendaciones para varias semillas [(song_name, artist_name), ...]
+
+        Devuelve {normalize_seed(...): (data, error)}; los fallos se informan por
+        semilla. Usa /recommend/batch si la API lo ofrece y, si no, peticiones
+        individuales concurrentes.
+        """
+        results = {}
+        missing = {}
+        for song_name, artist_name in seeds:
+            key = normalize_seed(song_name, artist_name)
+            if key in results or key in missing:
+                continue
+            cached = self.cache.get(key)
+            if cached is not None:
+                results[key] = cached
+            else:
+                missing[key] = (song_name, artist_name)
+
+        pending = list(missing.items())
+        if self.supports_batch is not False:
+            for start in range(0, len(pending), BATCH_MAX_SIZE):
+                chunk = pending[start:start + BATCH_MAX_SIZE]
+                chunk_results = self._post_batch(chunk)
+                if chunk_results is None:
+                    break
+                results.update(chunk_results)
+
+        # Sin endpoint por lotes (o semillas que faltan en su respuesta): de una en una
+        remaining = [(key, seed) for key, seed in pending if key not in results]
+        if remaining:
+            futures = {
+                key: self._fallback_executor.submit(self.recommend, *seed)
+                for key, seed in remaining
+            }
+            for key, future in futures.items():
+                results[key] = future.result()
+        return results
+
+    def _post_batch(self, chunk):
+        """Envía un lote a /recommend/batch; None si el servidor no lo soporta"""
+        try:
+            # Un lote es caro para el servidor: duplicarlo nunca compensa
+            response = self._post(
+                "/recommend/batch",
+                hedge=False,
+                json={"seeds": [
+                    {"song_name": song_name, "artist_name": artist_name}
+                    for _, (song_name, artist_name) in chunk
+                ]}
+            )
+        except Exception as e:
+            error = _error_for_exception(e)
+            return {key: (None, error) for key, _ in chunk}
+
+        if response.status_code in (404, 405, 501):
+            self.supports_batch = False
+            return None
+        if response.status_code != 200:
+            error = _error_for_status(response.status_code)
+            return {key: (None, error) for key, _ in chunk}
+
+        self.supports_batch = True
+        items = response.json().get("results", [])
+        item_size = len(response.content) // max(1, len(items))
+        results = {}
+        for (key, _), item in zip(chunk, items):
+            status = item.get("status")
+            if status == 200:
+                data = compact_payload(item["data"])
+                results[key] = (data, None)
+                self.cache.put(key, data, size=item_size)
+            elif status == 404:
+                error = _error_for_status(404, item.get("detail"))
+                results[key] = (None, error)
+                self.cache.put(key, None, error, size=item_size)
+            else:
+                results[key] = (None, _error_for_status(status))
+        return results
+
+
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/jsonl", "application/json-seq")
+SSE_MEDIA_TYPE = "text/event-stream"
+
+def iter_ndjson(lines):
+    """Un documento JSON por línea no vacía"""
+    for line in lines:
+        line = line.strip()
+        if line:
+            yield line
+
+def iter_sse(lines):
+    """Campos `data` de cada evento Server-Sent Events
+
+    Sigue el formato de eventos del estándar: las líneas que empiezan por ":"
+    son comentarios (keep-alive), `event`, `id` y `retry` se ignoran, varias
+    líneas `data` del mismo evento se unen con saltos de línea y el evento se
+    despacha al llegar una línea en blanco. Un evento sin terminar al cerrarse
+    el flujo se descarta.
+    """
+    buffer = []
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line:
+            if buffer:
+                yield "\n".join(buffer)
+                buffer = []
+            continue
+        if line.startswith(":"):
+            continue
+        field, _, value = line.partition(":")
+        if field == "data":
+            buffer.append(value[1:] if value.startswith(" ") else value)
+
+def _incomplete_stream_error(data, end):
+    """Error si el flujo terminó sin su evento final, sin canción o sin todas las filas"""
+    received = len(data["recommendations"])
+    if end is None:
+        reason = "el flujo se cerró antes de terminar"
+    elif data["song_found"] is None:
+        reason = "falta la canción encontrada"
+    elif end.get("count", received) != received:
+        reason = f"llegaron {received} de {end['count']} recomendaciones"
+    else:
+        return None
+    return f"❌ Respuesta incompleta de la API: {reason}"
+
+def stream_parser(content_type):
+    """Parser de eventos según el Content-Type de la respuesta (None si no es un flujo)"""
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type == SSE_MEDIA_TYPE:
+        return iter_sse
+    if media_type in NDJSON_MEDIA_TYPES:
+        return iter_ndjson
+    return None
+
+def _error_for_status(status_code, detail=None):
+    """Mensaje para el usuario a partir de un código HTTP de la API"""
+    if status_code == 404:
+        return f"❌ {detail}"
+    elif status_code == 503:
+        return "⚠️ El servicio no está disponible. Verifica que la API esté corriendo."
+    else:
+        return f"❌ Error inesperado: {status_code}"
+
+def _json_or_empty(response):
+    try:
+        body = response.json()
+    except ValueError:
+        return {}
+    return body if isinstance(body, dict) else {}
+
+def _error_for_exception(e):
+    """Mensaje para el usuario a partir de una excepción de red"""
+    if isinstance(e, requests.exceptions.ConnectionError):
+        return f"🔌 No se pudo conectar con la API. Asegúrate de que esté corriendo en {', '.join(API_REPLICA_URLS)}"
+    elif isinstance(e, requests.exceptions.Timeout):
+        return "⏱️ La petición tardó demasiado. Intenta de nuevo."
+    else:
+        return f"❌ Error inesperado: {str(e)}"
+
+@st.cache_resource
+def get_api_client():
+    """Cliente de la API compartido por todas las sesiones del proceso"""
+    probes = get_health_probes()
+    pool = ReplicaPool([Replica(url, probes.get(url)) for url in API_REPLICA_URLS])
+    return RecommendationClient(get_http_session(), get_response_cache(), pool, metrics=get_metrics())
+
+def get_recommendations(song_name, artist_name=""):
+    """Función para obtener recomendaciones de la API (o del motor integrado)"""
+    if ENGINE_MODE == "embedded":
+        try:
+            engine = get_embedded_engine()
+        except Exception as e:
+            return None, _error_for_engine(e)
+        return engine.recommend(song_name, artist_name)
+    return get_api_client().recommend(song_name, artist_name)
+
+def get_recommendations_batch(seeds):
+    """Función para obtener recomendaciones de varias semillas en una sola llamada"""
+    if ENGINE_MODE == "embedded":
+        try:
+            engine = get_embedded_engine()
+        except Exception as e:
+            error = _error_for_engine(e)
+            return {normalize_seed(song_name, artist_name): (None, error) for song_name, artist_name in seeds}
+        return engine.recommend_batch(seeds)
+    return get_api_client().recommend_batch(seeds)
+
+# ==========================================
+# MOTOR KNN INTEGRADO
+# ==========================================
+class EmbeddedKNNEngine:
+    """KNN exacto en proceso sobre un catálogo local, con el mismo payload que la API
+
+    El catálogo es un directorio con:
+      - features.npy: matriz (n_canciones, n_features) ya escalada, se abre con mmap
+      - tracks.parquet (o tracks.csv): metadatos en el mismo orden de filas; sus
+        columnas (name, artists, year, cluster_*, características...) forman cada
+        recomendación
+    """
+
+    def __init__(self, catalog_dir, k=EMBEDDED_K):
+        self.k = k
+        self.features = np.load(os.path.join(catalog_dir, "features.npy"), mmap_mode="r")
+        parquet_path = os.path.join(catalog_dir, "tracks.parquet")
+        if os.path.exists(parquet_path):
+            tracks = pd.read_parquet(parquet_path)
         else:
-            return None, f"❌ Error inesperado: {response.status_code}"
-    
-    except requests.exceptions.ConnectionError:
-        return None, "🔌 No se pudo conectar con la API. Asegúrate de que esté corriendo en http://127.0.0.1:8000"
-    except requests.exceptions.Timeout:
-        return None, "⏱️ La petición tardó demasiado. Intenta de nuevo."
-    except Exception as e:
-        return None, f"❌ Error inesperado: {str(e)}"
-
-def create_similarity_chart(recommendations):
-    """Crear gráfico de similitud con Plotly"""
-    similarities = []
-    song_names = []
-    # Check whether any recommendation contains available similarity fields
-    has_similarity = any(
-        (('similarity_percentage' in rec and rec['similarity_percentage'] is not None)
-         or ('similarity_score' in rec and rec['similarity_score'] is not None)
-         or ('similarity_distance' in rec and rec['similarity_distance'] is not None))
-        for rec in recommendations
+            tracks = pd.read_csv(os.path.join(catalog_dir, "tracks.csv"))
+        if len(tracks) != self.features.shape[0]:
+            raise ValueError(
+                f"El catálogo no es coherente: {len(tracks)} canciones y "
+                f"{self.features.shape[0]} filas de características"
+            )
+        self.columns = [c for c in tracks.columns if c != 'id']
+        # Filas como tuplas de tipos nativos (listas para serializar en el payload)
+        self.rows = list(tracks[self.columns].astype(object).where(tracks[self.columns].notna(), None)
+                         .itertuples(index=False, name=None))
+        # Normas al cuadrado precalculadas: d² = |x|² - 2·x·q + |q|²
+        self.sq_norms = np.einsum("ij,ij->i", self.features, self.features)
+        # Misma normalización que la semilla buscada (normalize_seed) a ambos lados
+        self.by_name = {}
+        name_idx = self.columns.index('name')
+        for row_idx, row in enumerate(self.rows):
+            self.by_name.setdefault(normalize_seed(str(row[name_idx]))[0], []).append(row_idx)
+
+    def find(self, song_name, artist_name=""):
+        candidates = self.by_name.get(normalize_seed(song_name)[0], [])
+        artist = normalize_seed("", artist_name)[1]
+        if artist:
+            artist_idx = self.columns.index('artists')
+            candidates = [i for i in candidates
+                          if artist in normalize_seed("", str(self.rows[i][artist_idx]))[1]]
+        return candidates[0] if candidates else None
+
+    def neighbours(self, row_idx, k):
+        """Índices y distancias de los k vecinos más cercanos (excluida la propia canción)"""
+        query = np.asarray(self.features[row_idx], dtype=np.float64)
+        sq_dist = self.sq_norms - 2.0 * (self.features @ query) + query @ query
+        sq_dist[row_idx] = np.inf
+        k = min(k, len(sq_dist) - 1)
+        if k <= 0:
+            return np.array([], dtype=int), np.array([])
+        top = np.argpartition(sq_dist, k - 1)[:k]
+        top = top[np.argsort(sq_dist[top], kind="stable")]
+        return top, np.sqrt(np.maximum(sq_dist[top], 0.0))
+
+    def recommend(self, song_name, artist_name=""):
+        """Devuelve (data, error) igual que get_recommendations"""
+        row_idx = self.find(song_name, artist_name)
+        if row_idx is None:
+            return None, _error_for_status(404, f"No se encontró la canción '{song_name}'")
+
+        found = dict(zip(self.columns, self.rows[row_idx]))
+        recommendations = []
+        for idx, distance in zip(*self.neighbours(row_idx, self.k)):
+            rec = dict(zip(self.columns, self.rows[idx]))
+            score = 1.0 / (1.0 + float(distance))
+            rec['similarity_distance'] = round(float(distance), 6)
+            rec['similarity_score'] = round(score, 6)
+            rec['similarity_percentage'] = round(score * 100.0, 2)
+            recommendations.append(rec)
+        return {
+            "song_found": {
+                "name": found['name'],
+                "artist": found['artists'],
+                "year": found.get('year'),
+            },
+            "recommendations": recommendations,
+        }, None
+
+    def recommend_batch(self, seeds):
+        return {
+            normalize_seed(song_name, artist_name): self.recommend(song_name, artist_name)
+            for song_name, artist_name in seeds
+        }
+
+class EmbeddedEngineLoader:
+    """Carga el motor integrado una sola vez; un fallo se recuerda `retry_interval` segundos
+
+    st.cache_resource no guarda las excepciones, así que sin esto un catálogo
+    ausente o corrupto se volvería a leer en cada llamada.
+    """
+
+    def __init__(self, catalog_dir, retry_interval):
+        self.catalog_dir = catalog_dir
+        self.retry_interval = retry_interval
+        self._engine = None
+        self._error = None
+        self._failed_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._engine is not None:
+                return self._engine
+            if self._error is not None and time.monotonic() - self._failed_at < self.retry_interval:
+                raise self._error.with_traceback(None)
+            try:
+                self._engine = EmbeddedKNNEngine(self.catalog_dir)
+            except Exception as e:
+                self._error, self._failed_at = e, time.monotonic()
+                raise
+            self._error = None
+            return self._engine
+
+@st.cache_resource
+def get_embedded_loader():
+    return EmbeddedEngineLoader(CATALOG_DIR, EMBEDDED_RETRY_INTERVAL)
+
+def get_embedded_engine():
+    """Motor KNN integrado, cargado una vez y compartido por todas las sesiones"""
+    return get_embedded_loader().get()
+
+def _error_for_engine(e):
+    return f"❌ No se pudo cargar el catálogo de {CATALOG_DIR}: {e}"
+
+# ==========================================
+# SONDA DE SALUD
+# ==========================================
+class HealthProbe:
+    """Comprueba la API periódicamente en un hilo; la interfaz solo lee el último estado"""
+
+    def __init__(self, url, interval, timeout):
+        self.url = url
+        self.interval = interval
+        self.timeout = timeout
+        # Sesión propia sin reintentos para que la latencia medida sea la real
+        self._session = requests.Session()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._snapshot = {
+            "state": None,  # None (sin comprobar), "ok", "error" o "down"
+            "status_code": None,
+            "latency_ms": None,
+            "checked_at": None,
+            "capabilities": (),
+        }
+        self._thread = threading.Thread(target=self._run, name="health-probe", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.probe()
+            self._stop.wait(self.interval)
+
+    def probe(self):
+        """Hace una comprobación y actualiza el estado compartido"""
+        started = time.perf_counter()
+        status_code = None
+        capabilities = ()
+        try:
+            response = self._session.get(self.url, timeout=self.timeout)
+            status_code = response.status_code
+            state = "ok" if status_code == 200 else "error"
+            if state == "ok":
+                try:
+                    capabilities = tuple(response.json().get("capabilities", ()))
+                except (ValueError, AttributeError):
+                    pass
+        except requests.exceptions.RequestException:
+            state = "down"
+        latency_ms = (time.perf_counter() - started) * 1000.0
+        with self._lock:
+            self._snapshot = {
+                "state": state,
+                "status_code": status_code,
+                "latency_ms": latency_ms,
+                "checked_at": time.time(),
+                "capabilities": capabilities,
+            }
+
+    @property
+    def state(self):
+        """Último estado conocido sin copiar la instantánea (para el balanceo)"""
+        return self._snapshot["state"]
+
+    def snapshot(self):
+        """Último estado conocido, con su antigüedad en segundos"""
+        with self._lock:
+            snapshot = dict(self._snapshot)
+        checked_at = snapshot["checked_at"]
+        snapshot["age_s"] = time.time() - checked_at if checked_at is not None else None
+        return snapshot
+
+    def stop(self):
+        self._stop.set()
+
+@st.cache_resource
+def get_health_probes():
+    """Una sonda de salud por réplica, compartidas por todas las sesiones del proceso"""
+    return {url: HealthProbe(f"{url}/", HEALTH_INTERVAL, HEALTH_TIMEOUT) for url in API_REPLICA_URLS}
+
+# ==========================================
+# PRECARGA ESPECULATIVA
+# ==========================================
+class PrefetchBatch:
+    """Precargas lanzadas por una sesión; se cancelan al empezar otra búsqueda"""
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self.futures = {}  # key -> Future
+
+    def cancel(self):
+        self.cancelled.set()
+        for future in self.futures.values():
+            future.cancel()
+
+    def pending(self):
+        return sum(1 for future in self.futures.values() if not future.done())
+
+    def prune(self):
+        """Olvida las precargas terminadas (su resultado ya está en la caché de respuestas)"""
+        self.futures = {key: future for key, future in self.futures.items() if not future.done()}
+
+@st.cache_resource
+def get_prefetch_executor():
+    """Pool de hilos acotado y compartido para las precargas de todas las sesiones"""
+    return ThreadPoolExecutor(max_workers=PREFETCH_MAX_WORKERS, thread_name_prefix="prefetch")
+
+def _prefetch_seeds(cancelled, seeds, client):
+    if cancelled.is_set():
+        return
+    client.recommend_batch(seeds)
+
+def schedule_prefetch(recommendations):
+    """Precarga en segundo plano las recomendaciones de las primeras filas"""
+    # Con el motor integrado cada consulta es inmediata: no hay nada que adelantar
+    if not st.session_state.prefetch_enabled or ENGINE_MODE == "embedded":
+        return
+    batch = st.session_state.prefetch_batch
+    if batch is None or batch.cancelled.is_set():
+        batch = st.session_state.prefetch_batch = PrefetchBatch()
+    batch.prune()
+
+    client = get_api_client()
+    seeds = {}
+    for rec in recommendations[:PREFETCH_TOP_N]:
+        key = normalize_seed(rec['name'], rec['artists'])
+        if key not in batch.futures and not client.cache.contains(key):
+            seeds[key] = (rec['name'], rec['artists'])
+    if not seeds:
+        return
+
+    # Un único lote (una petición si la API soporta /recommend/batch)
+    future = get_prefetch_executor().submit(
+        _prefetch_seeds, batch.cancelled, list(seeds.values()), client
+    )
+    for key in seeds:
+        batch.futures[key] = future
+
+def cancel_prefetch():
+    """Cancela las precargas pendientes de la sesión actual"""
+    batch = st.session_state.prefetch_batch
+    if batch is not None:
+        batch.cancel()
+    st.session_state.prefetch_batch = None
+
+def wait_for_prefetch(song_name, artist_name=""):
+    """Si la semilla se está precargando, espera a esa petición en vez de duplicarla"""
+    batch = st.session_state.prefetch_batch
+    if batch is None:
+        return
+    future = batch.futures.get(normalize_seed(song_name, artist_name))
+    if future is not None and not future.cancelled():
+        try:
+            future.result(timeout=API_CONNECT_TIMEOUT + API_READ_TIMEOUT)
+        except Exception:
+            pass
+
+# ==========================================
+# NORMALIZACIÓN DE RECOMENDACIONES
+# ==========================================
+TEXT_COLUMNS = ['name', 'artists', 'cluster_type', 'cluster_id', 'cluster_features']
+INT_COLUMNS = ['year', 'popularity']
+SIMILARITY_COLUMNS = ['similarity_percentage', 'similarity_score', 'similarity_distance']
+AUDIO_FEATURE_COLUMNS = ['danceability', 'energy', 'valence', 'acousticness', 'speechiness']
+
+class IdentityCache:
+    """LRU acotada en entradas y bytes, indexada por identidad de objeto (p. ej. la lista de una respuesta)"""
+
+    def __init__(self, max_entries, max_bytes, sizer=lambda value: 0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizer = sizer
+        self.bytes = 0
+        self._entries = OrderedDict()  # id(obj) -> (obj, value, size)
+        self._lock = threading.Lock()
+
+    def get(self, obj):
+        with self._lock:
+            entry = self._entries.get(id(obj))
+            # Guardar `obj` evita que su id se reutilice mientras siga en la caché
+            if entry is None or entry[0] is not obj:
+                return None
+            self._entries.move_to_end(id(obj))
+            return entry[1]
+
+    def put(self, obj, value):
+        size = self.sizer(value)
+        with self._lock:
+            previous = self._entries.pop(id(obj), None)
+            if previous is not None:
+                self.bytes -= previous[2]
+            # Un valor que no cabe entero no se guarda (no vaciaría la caché para nada)
+            if size > self.max_bytes:
+                return
+            self._entries[id(obj)] = (obj, value, size)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.bytes}
+
+def _frame_nbytes(frame):
+    return int(frame.memory_usage(deep=True).sum())
+
+@st.cache_resource
+def get_frame_cache():
+    """DataFrames normalizados compartidos, uno por respuesta de la API"""
+    return IdentityCache(CACHE_MAX_ENTRIES, FRAME_CACHE_MAX_BYTES, sizer=_frame_nbytes)
+
+def _build_recommendations_frame(recommendations):
+    """Convierte la lista JSON en un DataFrame tipado con operaciones vectorizadas"""
+    if isinstance(recommendations, (RecordsView, CompactRecords)):
+        # Respuesta columnar (Arrow/msgpack o compactada): sin pasar por dicts
+        df = recommendations.to_frame()
+    else:
+        df = pd.DataFrame(recommendations)
+
+    # Añadir de una vez las columnas que la API no haya enviado
+    expected_cols = TEXT_COLUMNS + INT_COLUMNS + SIMILARITY_COLUMNS + AUDIO_FEATURE_COLUMNS
+    missing = [col for col in expected_cols if col not in df.columns]
+    if missing:
+        df = df.reindex(columns=list(df.columns) + missing)
+
+    # pandas turns integer cluster ids into floats when some rows lack one
+    cluster_ids = pd.to_numeric(df['cluster_id'], errors='coerce')
+    present = cluster_ids.dropna()
+    if len(present) == df['cluster_id'].notna().sum() and (present % 1 == 0).all():
+        df['cluster_id'] = cluster_ids.astype('Int64')
+
+    df[TEXT_COLUMNS] = df[TEXT_COLUMNS].astype(object).where(df[TEXT_COLUMNS].notna(), '')
+    df[INT_COLUMNS] = df[INT_COLUMNS].apply(pd.to_numeric, errors='coerce').fillna(0).astype(int)
+    numeric_cols = SIMILARITY_COLUMNS + AUDIO_FEATURE_COLUMNS
+    df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric, errors='coerce').astype(float)
+
+    # Similitud unificada (0-100) por fila: porcentaje, luego score (0-1), luego distancia legacy
+    df['similarity_pct'] = (
+        df['similarity_percentage']
+        .combine_first(df['similarity_score'] * 100.0)
+        .combine_first(100.0 - df['similarity_distance'] * 10.0)
+        .clip(0, 100)
     )
+    return df
+
+def normalize_recommendations(recommendations):
+    """DataFrame normalizado de una respuesta, calculado una sola vez por respuesta"""
+    cache = get_frame_cache()
+    frame = cache.get(recommendations)
+    if frame is None:
+        frame = _build_recommendations_frame(recommendations)
+        cache.put(recommendations, frame)
+    return frame
 
+# ==========================================
+# VISUALIZACIÓN
+# ==========================================
+def similarity_chart_key(frame):
+    """Hash del contenido que se dibuja (nombres y similitudes)"""
+    hashes = pd.util.hash_pandas_object(frame[['name', 'similarity_pct']], index=False)
+    return hashlib.blake2b(hashes.to_numpy().tobytes(), digest_size=16).hexdigest()
+
+def create_similarity_chart(frame):
+    """Crear gráfico de similitud con Plotly (memoizado por contenido)"""
     # If there's no similarity info, return None so caller can handle it
-    if not has_similarity:
+    if frame['similarity_pct'].isna().all():
         return None
+    return _build_similarity_chart(similarity_chart_key(frame), frame)
 
-    for rec in recommendations:
-        # Prefer new fields: similarity_percentage (already in %), then similarity_score (0-1),
-        # then legacy similarity_distance
-        similarity = None
-        if 'similarity_percentage' in rec and rec['similarity_percentage'] is not None:
-            try:
-                similarity = float(rec['similarity_percentage'])
-            except Exception:
-                similarity = None
-        elif 'similarity_score' in rec and rec['similarity_score'] is not None:
-            try:
-                similarity = float(rec['similarity_score']) * 100.0
-            except Exception:
-                similarity = None
-        elif 'similarity_distance' in rec and rec['similarity_distance'] is not None:
-            try:
-                similarity = 100 - (float(rec['similarity_distance']) * 10.0)
-            except Exception:
-                similarity = None
-
-        # If still None, treat as 0 for chart alignment (but caller hides chart if no similarities)
-        if similarity is None:
-            similarity = 0.0
-        similarity = max(0, min(100, similarity))
-        similarities.append(similarity)
-        song_label = f"{rec['name'][:30]}..." if len(rec['name']) > 30 else rec['name']
-        song_names.append(song_label)
+@st.cache_resource(max_entries=CHART_CACHE_MAX_ENTRIES, show_spinner=False)
+def _build_similarity_chart(content_key, _frame):
+    """Construye la figura; `content_key` identifica el contenido de `_frame`"""
+    frame = _frame
+    total = len(frame)
+    # Modo ligero: con muchas barras solo se dibujan las más similares, sin etiquetas
+    lightweight = total > CHART_MAX_BARS
+    if lightweight:
+        frame = frame.loc[frame['similarity_pct'].fillna(0.0).nlargest(CHART_MAX_BARS).index.sort_values()]
+
+    # Missing values are drawn as 0 to keep the bars aligned with the song names
+    similarities = frame['similarity_pct'].fillna(0.0).tolist()
+    names = frame['name'].astype(str)
+    song_names = names.where(names.str.len() <= 30, names.str.slice(0, 30) + '...').tolist()
     
     # Colores basados en similitud
     colors = ['#1DB954' if s >= 90 else '#4CAF50' if s >= 80 else '#FFA726' if s >= 70 else '#FF7043' 
@@ -188,21 +1906,32 @@ def create_similarity_chart(recommendations):
     
     fig = go.Figure()
     
-    fig.add_trace(go.Bar(
-        x=song_names,
-        y=similarities,
-        marker=dict(
-            color=colors,
-            line=dict(color='rgba(0,0,0,0.3)', width=1)
-        ),
-        text=[f'{s:.1f}%' for s in similarities],
-        textposition='outside',
-        hovertemplate='<b>%{x}</b><br>Similitud: %{y:.1f}%<extra></extra>'
-    ))
+    if lightweight:
+        fig.add_trace(go.Bar(
+            x=song_names,
+            y=similarities,
+            marker=dict(color=colors),
+            hovertemplate='<b>%{x}</b><br>Similitud: %{y:.1f}%<extra></extra>'
+        ))
+    else:
+        fig.add_trace(go.Bar(
+            x=song_names,
+            y=similarities,
+            marker=dict(
+                color=colors,
+                line=dict(color='rgba(0,0,0,0.3)', width=1)
+            ),
+            text=[f'{s:.1f}%' for s in similarities],
+            textposition='outside',
+            hovertemplate='<b>%{x}</b><br>Similitud: %{y:.1f}%<extra></extra>'
+        ))
     
+    title = '📊 Nivel de Similitud con la Canción Original'
+    if lightweight:
+        title += f' (top {CHART_MAX_BARS} de {total})'
     fig.update_layout(
         title={
-            'text': '📊 Nivel de Similitud con la Canción Original',
+            'text': title,
             'x': 0.5,
             'xanchor': 'center',
             'font': {'size': 20, 'color': '#1DB954', 'family': 'Arial Black'}
@@ -220,150 +1949,136 @@ def create_similarity_chart(recommendations):
     
     return fig
 
-def display_recommendations_table(data, key_suffix=""):
+FEATURE_LABELS = [
+    ('danceability', "💃 Dance"),
+    ('energy', "⚡ Energy"),
+    ('valence', "😊 Valence"),
+    ('acousticness', "🎧 Acoustic"),
+    ('speechiness', "🗣️ Speech"),
+]
+
+def render_recommendation_card(i, rec):
+    """Tarjeta de una recomendación (fila del DataFrame normalizado)"""
+    with st.container():
+        st.markdown(f'<div class="song-card">', unsafe_allow_html=True)
+        col1, col2, col3 = st.columns([3, 2, 1])
+        
+        with col1:
+            st.markdown(f"**{i}. {rec['name']}**")
+            st.markdown(f"👤 {rec['artists']}")
+        
+        with col2:
+            st.markdown(f"📅 {rec['year']}")
+            st.markdown(f"⭐ Popularidad: {rec['popularity']}")
+            # Audio features (if present)
+            features = [
+                f"{label}: {rec[col]:.2f}"
+                for col, label in FEATURE_LABELS
+                if not pd.isna(rec[col])
+            ]
+            if features:
+                st.markdown("• " + " • ".join(features))
+        
+        with col3:
+            # Show cluster info briefly
+            if rec['cluster_type']:
+                st.write(f"🏷️ Cluster: {rec['cluster_type']}")
+            if rec['cluster_id']:
+                st.write(f"🆔 Cluster ID: {rec['cluster_id']}")
+
+            if pd.isna(rec['similarity_pct']):
+                st.metric("Similitud", "N/A")
+            else:
+                st.metric("Similitud", f"{rec['similarity_pct']:.1f}%")
+        
+        st.markdown('</div>', unsafe_allow_html=True)
+
+def render_found_song(found):
+    """Bloque de la canción encontrada para la búsqueda principal"""
+    st.markdown('<div class="found-song">', unsafe_allow_html=True)
+    st.markdown("### ✅ Canción encontrada")
+    st.markdown(f"**🎵 {found['name']}**")
+    st.markdown(f"👤 {found['artist']}")
+    st.markdown(f"📅 Año: {found['year']}")
+    st.markdown('</div>', unsafe_allow_html=True)
+
+def display_recommendations_table(data, key_suffix="", level=None):
     """Función para mostrar solo la tabla de recomendaciones"""
+    metrics = get_metrics()
     recommendations = data['recommendations']
+    with metrics.phase("normalize", level):
+        frame = normalize_recommendations(recommendations)
+        
+        # Crear DataFrame para la tabla interactiva
+        display_cols = ['name', 'artists', 'year', 'popularity', 'cluster_type', 'similarity_pct']
+        df_display = frame[display_cols].copy()
+        df_display['similarity_pct'] = df_display['similarity_pct'].round(2)
+        # Rename to Spanish for the table
+        df_display.columns = ['Canción', 'Artista', 'Año', 'Popularidad', 'Tipo', 'Similitud (%)']
     
-    # Crear DataFrame para la tabla interactiva
-    df_display = pd.DataFrame(recommendations)
-
-    # Ensure required columns exist to avoid KeyError if API omits any
-    expected_cols = [
-        'name', 'artists', 'year', 'popularity',
-        # similarity fields (new + legacy)
-        'similarity_percentage', 'similarity_score', 'similarity_distance',
-        # cluster and features
-        'cluster_type', 'cluster_id', 'cluster_features',
-        # audio features
-        'danceability', 'energy', 'valence', 'acousticness', 'speechiness'
-    ]
-
-    for col in expected_cols:
-        if col not in df_display.columns:
-            # sensible defaults: empty strings for text, NA for similarity, 0 for numeric
-            if col in ('similarity_percentage', 'similarity_score', 'similarity_distance'):
-                df_display[col] = pd.NA
-            elif col in ('year', 'popularity'):
-                df_display[col] = 0
-            elif col in ('danceability', 'energy', 'valence', 'acousticness', 'speechiness'):
-                df_display[col] = pd.NA
-            else:
-                df_display[col] = ''
-
-    # Build a unified similarity percentage column (0-100) from available fields
-    if 'similarity_percentage' in df_display.columns and not df_display['similarity_percentage'].isna().all():
-        df_display['similarity_pct'] = pd.to_numeric(df_display['similarity_percentage'], errors='coerce')
-    elif 'similarity_score' in df_display.columns and not df_display['similarity_score'].isna().all():
-        df_display['similarity_pct'] = pd.to_numeric(df_display['similarity_score'], errors='coerce') * 100.0
-    elif 'similarity_distance' in df_display.columns and not df_display['similarity_distance'].isna().all():
-        df_display['similarity_pct'] = 100.0 - (pd.to_numeric(df_display['similarity_distance'], errors='coerce') * 10.0)
-    else:
-        df_display['similarity_pct'] = pd.NA
-
-    # Safely select and coerce types for table display
-    display_cols = ['name', 'artists', 'year', 'popularity', 'cluster_type', 'similarity_pct']
-    for c in display_cols:
-        if c not in df_display.columns:
-            df_display[c] = pd.NA
-
-    df_display = df_display[display_cols]
-    df_display['year'] = pd.to_numeric(df_display['year'], errors='coerce').fillna(0).astype(int)
-    df_display['popularity'] = pd.to_numeric(df_display['popularity'], errors='coerce').fillna(0).astype(int)
-    # Round similarity_pct and keep NA when missing
-    df_display['similarity_pct'] = pd.to_numeric(df_display['similarity_pct'], errors='coerce').round(2)
-    # Rename to Spanish for the table
-    df_display.columns = ['Canción', 'Artista', 'Año', 'Popularidad', 'Tipo', 'Similitud (%)']
-    
-    # Mostrar tarjetas individuales
-    for i, rec in enumerate(recommendations, 1):
-        with st.container():
-            st.markdown(f'<div class="song-card">', unsafe_allow_html=True)
-            col1, col2, col3 = st.columns([3, 2, 1])
-            
-            with col1:
-                st.markdown(f"**{i}. {rec['name']}**")
-                st.markdown(f"👤 {rec['artists']}")
-            
-            with col2:
-                st.markdown(f"📅 {int(rec.get('year', 0))}")
-                st.markdown(f"⭐ Popularidad: {int(rec.get('popularity', 0))}")
-                # Audio features (if present)
-                ad = rec.get('danceability')
-                en = rec.get('energy')
-                va = rec.get('valence')
-                ac = rec.get('acousticness')
-                sp = rec.get('speechiness')
-                features = []
-                if ad is not None:
-                    features.append(f"💃 Dance: {float(ad):.2f}")
-                if en is not None:
-                    features.append(f"⚡ Energy: {float(en):.2f}")
-                if va is not None:
-                    features.append(f"😊 Valence: {float(va):.2f}")
-                if ac is not None:
-                    features.append(f"🎧 Acoustic: {float(ac):.2f}")
-                if sp is not None:
-                    features.append(f"🗣️ Speech: {float(sp):.2f}")
-                if features:
-                    st.markdown("• " + " • ".join(features))
-            
-            with col3:
-                # Compute similarity from available fields (prefer percentage, then score, then legacy distance)
-                similarity = None
-                if 'similarity_percentage' in rec and rec.get('similarity_percentage') is not None:
-                    try:
-                        similarity = float(rec.get('similarity_percentage'))
-                    except Exception:
-                        similarity = None
-                elif 'similarity_score' in rec and rec.get('similarity_score') is not None:
-                    try:
-                        similarity = float(rec.get('similarity_score')) * 100.0
-                    except Exception:
-                        similarity = None
-                elif 'similarity_distance' in rec and rec.get('similarity_distance') is not None:
-                    try:
-                        similarity = 100 - (float(rec.get('similarity_distance')) * 10.0)
-                    except Exception:
-                        similarity = None
-
-                # Show cluster info briefly
-                cluster_type = rec.get('cluster_type')
-                cluster_id = rec.get('cluster_id')
-                if cluster_type:
-                    st.write(f"🏷️ Cluster: {cluster_type}")
-                if cluster_id:
-                    st.write(f"🆔 Cluster ID: {cluster_id}")
-
-                if similarity is None or pd.isna(similarity):
-                    st.metric("Similitud", "N/A")
-                else:
-                    similarity = max(0, min(100, similarity))
-                    st.metric("Similitud", f"{similarity:.1f}%")
-            
-            st.markdown('</div>', unsafe_allow_html=True)
+    # Mostrar tarjetas individuales (solo las de la página visible)
+    page_size = st.session_state.cards_page_size
+    n_pages = max(1, -(-len(frame) // page_size))
+    page = 1
+    if n_pages > 1:
+        found = data.get('song_found') or {}
+        seed_key = "|".join(normalize_seed(str(found.get('name', '')), str(found.get('artist', ''))))
+        page_col, info_col = st.columns([1, 3])
+        with page_col:
+            page = st.number_input(
+                "Página",
+                min_value=1,
+                max_value=n_pages,
+                value=1,
+                step=1,
+                key=f"cards_page_{key_suffix}_{seed_key}"
+            )
+        with info_col:
+            st.caption(
+                f"Mostrando {(page - 1) * page_size + 1}–{min(page * page_size, len(frame))} "
+                f"de {len(frame)} recomendaciones"
+            )
+    start = (page - 1) * page_size
+    page_frame = frame.iloc[start:start + page_size]
+
+    with metrics.phase("cards", level):
+        for i, rec in enumerate(page_frame.to_dict('records'), start + 1):
+            render_recommendation_card(i, rec)
     
     # Tabla interactiva con selección
     st.markdown("---")
     st.markdown("### 📊 Haz clic en una canción para ver sus recomendaciones")
     
     # Usar dataframe con selección de eventos
-    event = st.dataframe(
-        df_display,
-        use_container_width=True,
-        hide_index=False,
-        on_select="rerun",
-        selection_mode="single-row",
-        key=f"dataframe_{key_suffix}"
-    )
+    with metrics.phase("table", level):
+        event = st.dataframe(
+            df_display,
+            use_container_width=True,
+            hide_index=False,
+            on_select="rerun",
+            selection_mode="single-row",
+            key=f"dataframe_{key_suffix}"
+        )
     
-    # GRÁFICO DE SIMILITUD AL FINAL
+    # GRÁFICO DE SIMILITUD AL FINAL (solo se calcula con el desplegable abierto)
     st.markdown("---")
-    st.markdown("### 📈 Gráfico de Similitud")
-    fig = create_similarity_chart(recommendations)
-    if fig is None:
-        st.info("ℹ️ La API no devolvió datos de similitud (campo 'similarity_distance'). El gráfico no se puede mostrar.")
-    else:
-        st.plotly_chart(fig, use_container_width=True)
+    chart_panel = st.expander(
+        "📈 Gráfico de Similitud",
+        expanded=CHARTS_EXPANDED,
+        key=f"chart_{key_suffix}",
+        on_change="rerun"
+    )
+    with chart_panel:
+        if chart_panel.open:
+            with metrics.phase("chart", level):
+                fig = create_similarity_chart(frame)
+                if fig is None:
+                    st.info("ℹ️ La API no devolvió datos de similitud (campo 'similarity_distance'). El gráfico no se puede mostrar.")
+                else:
+                    st.plotly_chart(fig, use_container_width=True)
+    
+    # Precargar el siguiente nivel mientras el usuario mira la tabla
+    schedule_prefetch(recommendations)
     
     # Retornar la selección
     if event.selection and len(event.selection.rows) > 0:
@@ -372,147 +2087,731 @@ def display_recommendations_table(data, key_suffix=""):
     
     return None
 
+# ==========================================
+# GRAFO DE EXPLORACIÓN
+# ==========================================
+class ExplorationNode:
+    """Semilla visitada; solo guarda su clave, la respuesta vive en el PayloadStore"""
+
+    __slots__ = ('key', 'id', 'song_name', 'artist_name', 'nbytes', '_store')
+
+    def __init__(self, key, song_name, artist_name, store):
+        self.key = key
+        self.id = hashlib.blake2b("\x1f".join(key).encode("utf-8"), digest_size=6).hexdigest()
+        self.song_name = song_name
+        self.artist_name = artist_name
+        self.nbytes = None  # None = sin respuesta cargada
+        self._store = store
+
+    @property
+    def data(self):
+        return self._store.get(self.key) if self.nbytes is not None else None
+
+class ExplorationGraph:
+    """Grafo de exploración de una sesión
+
+    Los nodos son semillas (deduplicadas por clave normalizada) cuyas
+    recomendaciones se piden una sola vez; las aristas son las selecciones del
+    usuario. `path` es la rama visible, de la raíz al nivel más profundo.
+    `partial` marca una raíz recibida a medias (streaming cortado).
+
+    Las respuestas se comparten entre sesiones a través del PayloadStore; el
+    grafo solo cuenta referencias. Cada respuesta cargada se carga entera al
+    presupuesto de memoria de la sesión (`max_bytes`) y, al superarlo, se
+    olvidan los nodos fuera de la rama visible usados hace más tiempo; si ni
+    así cabe, no se baja más. La rama tiene como mucho `max_nodes` niveles, así
+    que ni los nodos ni la memoria crecen con la profundidad.
+    """
+
+    def __init__(self, root_song, root_artist, root_data, max_nodes=EXPLORATION_MAX_NODES,
+                 max_bytes=SESSION_MEMORY_BUDGET, store=None, partial=False):
+        self.max_nodes = max(1, max_nodes)
+        self.max_bytes = max_bytes
+        self.store = store if store is not None else get_payload_store()
+        self.nbytes = 0
+        self.nodes = OrderedDict()  # key -> ExplorationNode, en orden LRU
+        self.edges = {}  # key padre -> set de keys hijas
+        # Claves con referencia en el almacén; se sueltan aunque la sesión se cierre sin avisar
+        self._pinned = set()
+        weakref.finalize(self, self.store.release_many, self._pinned)
+        root = self._node(root_song, root_artist, partial)
+        self.path = [root.key]
+        self.attach(root, root_data)
+        # Se incrementa al volver atrás para vaciar la selección de la tabla de ese nivel
+        self.generations = {}
+
+    @property
+    def root(self):
+        return self.nodes[self.path[0]]
+
+    def node_at(self, depth):
+        node = self.nodes[self.path[depth]]
+        self.nodes.move_to_end(node.key)
+        return node
+
+    def widget_key(self, depth):
+        """Sufijo de los widgets de un nivel (cambia con el nodo o al volver atrás)"""
+        return f"{depth}_{self.nodes[self.path[depth]].id}_{self.generations.get(depth, 0)}"
+
+    def attach(self, node, data):
+        """Guarda (compartida) la respuesta de un nodo y aplica los límites de la sesión
+
+        Devuelve None si ni olvidando los nodos fuera de la rama visible cabe en
+        el presupuesto (salvo la raíz, que siempre se guarda).
+        """
+        if node.nbytes is None:
+            payload = self.store.acquire(node.key, data)
+            self._pinned.add(node.key)
+            node.nbytes = payload_nbytes(payload)
+            self.nbytes += node.nbytes
+            self._evict()
+            if self.nbytes > self.max_bytes and node.key != self.path[0]:
+                self._unload(node)
+                return None
+        return node.data
+
+    def select(self, depth, song_name, artist_name=""):
+        """Registra la selección hecha en el nivel `depth` y devuelve el nodo hijo
+
+        Si la semilla ya está en la rama (A → B → A) se vuelve a su nivel en vez
+        de repetirla: la rama termina en ese nodo y es el que se devuelve. Si la
+        rama ya tiene `max_nodes` niveles no se baja más y se devuelve None (la
+        rama nunca tiene más nodos de los que admite el grafo).
+        """
+        key = normalize_seed(song_name, artist_name)
+        if key in self.path[:depth + 1]:
+            self.back(self.path.index(key) + 1)
+            self.generations[depth] = self.generations.get(depth, 0) + 1
+            return self.nodes[key]
+        if depth + 1 >= self.max_nodes:
+            self.truncate(depth)
+            return None
+        child = self._node(song_name, artist_name)
+        parent_key = self.path[depth]
+        self.edges.setdefault(parent_key, set()).add(child.key)
+        if self.path[depth + 1:depth + 2] != [child.key]:
+            self.path = self.path[:depth + 1] + [child.key]
+        self._evict()
+        return child
+
+    def truncate(self, depth):
+        """Deja visible solo hasta el nivel `depth` (incluido)"""
+        del self.path[depth + 1:]
+
+    def back(self, depth):
+        """Vuelve al nivel `depth - 1` limpiando su selección"""
+        self.truncate(depth - 1)
+        self.generations[depth - 1] = self.generations.get(depth - 1, 0) + 1
+
+    def _node(self, song_name, artist_name, partial=False):
+        key = normalize_seed(song_name, artist_name)
+        if partial:
+            # Una respuesta incompleta no debe sustituir a la completa en el almacén compartido
+            key += ("partial",)
+        node = self.nodes.get(key)
+        if node is None:
+            node = self.nodes[key] = ExplorationNode(key, song_name, artist_name, self.store)
+        self.nodes.move_to_end(key)
+        return node
+
+    def _evict(self):
+        """Olvida los nodos usados hace más tiempo que no están en la rama visible
+
+        La rama visible no se toca aquí: su profundidad la acota `select` y su
+        memoria `attach`.
+        """
+        on_path = set(self.path)
+        for key in list(self.nodes):
+            if len(self.nodes) <= self.max_nodes and self.nbytes <= self.max_bytes:
+                break
+            if key in on_path:
+                continue
+            self._unload(self.nodes.pop(key))
+            self.edges.pop(key, None)
+            for children in self.edges.values():
+                children.discard(key)
+
+    def _unload(self, node):
+        """Suelta la respuesta de un nodo (el nodo, si sigue en el grafo, la volverá a pedir)"""
+        if node.nbytes is not None:
+            self.nbytes -= node.nbytes
+            node.nbytes = None
+            self.store.release(node.key)
+            self._pinned.discard(node.key)
+
+def load_node(graph, node, depth=None):
+    """Recomendaciones de un nodo; se piden a la API una sola vez por nodo"""
+    data = node.data
+    if data is not None:
+        return data, None
+    with get_metrics().phase("fetch", depth):
+        wait_for_prefetch(node.song_name, node.artist_name)
+        data, error = get_recommendations(node.song_name, node.artist_name)
+    if data:
+        data = graph.attach(node, data)
+        if data is None:
+            error = (f"🧠 Se ha alcanzado el límite de memoria de la sesión ({graph.max_bytes // 1024} KB). "
+                     "Vuelve a un nivel anterior para seguir explorando.")
+    return data, error
+
+@st.fragment
+def render_level(depth):
+    """Un nivel de exploración; al seleccionar una fila solo se reejecuta este fragmento"""
+    metrics = get_metrics()
+    # Un fragmento que se reejecuta solo no pasa por el principio ni el final del script
+    if metrics.current_rerun() is None:
+        with measured_rerun("fragment"):
+            _render_level(depth)
+    else:
+        _render_level(depth)
+
+def _render_level(depth):
+    graph = st.session_state.graph
+    node = graph.node_at(depth)
+    selected = display_recommendations_table(node.data, key_suffix=graph.widget_key(depth), level=depth)
+    if not selected:
+        graph.truncate(depth)
+        return
+
+    child = graph.select(depth, selected['name'], selected['artists'])
+    if child is None:
+        st.info(f"🧭 Has llegado al máximo de {graph.max_nodes} niveles de exploración. "
+                "Vuelve a un nivel anterior para seguir explorando.")
+        return
+    if len(graph.path) <= depth + 1:
+        # La canción ya estaba en la rama: se vuelve a su nivel
+        st.rerun()
+    child_depth = depth + 1
+    if child_depth == 1:
+        st.markdown('<div class="nested-rec">', unsafe_allow_html=True)
+        st.markdown(f"### 🔄 Recomendaciones basadas en: **{selected['name']}**")
+        st.markdown(f"**Artista:** {selected['artists']}")
+        spinner_text = "🎵 Cargando recomendaciones..."
+    else:
+        st.markdown("---")
+        st.markdown(f"### {'🔄' * child_depth} Explorando: **{selected['name']}**")
+        spinner_text = "🎵 Cargando más recomendaciones..."
+
+    if st.button("⬅️ Volver", key=f"back_{graph.widget_key(depth)}"):
+        graph.back(child_depth)
+        st.rerun()
+
+    with st.spinner(spinner_text):
+        child_data, child_error = load_node(graph, child, child_depth)
+
+    if child_data:
+        child_found = child_data['song_found']
+        if child_depth == 1:
+            # Mostrar canción encontrada para la selección
+            st.markdown("---")
+            st.markdown(f"✅ **{child_found['name']}** - {child_found['artist']} ({child_found['year']})")
+        else:
+            st.markdown(f"✅ **{child_found['name']}** - {child_found['artist']}")
+        render_level(child_depth)
+    elif child_error:
+        st.error(child_error)
+
+    if child_depth == 1:
+        st.markdown('</div>', unsafe_allow_html=True)
+
+# ==========================================
+# BÚSQUEDA PROGRESIVA
+# ==========================================
+def stream_search(song_name, artist_name=""):
+    """Búsqueda principal mostrando la canción y las primeras tarjetas según llegan
+
+    Devuelve (data, error, first_rec_ms); si el flujo se corta a medias llegan
+    a la vez lo recibido y el error.
+    """
+    client = get_api_client()
+    started = time.perf_counter()
+    first_rec_ms = None
+    count = 0
+    partial = None
+    progress = st.empty()
+    with progress.container():
+        for kind, value in client.recommend_stream(song_name, artist_name):
+            if kind == "song_found":
+                render_found_song(value)
+                st.markdown('<h2 class="rec-title">🎯 Recomendaciones para ti:</h2>', unsafe_allow_html=True)
+            elif kind == "recommendation":
+                count += 1
+                if first_rec_ms is None:
+                    first_rec_ms = (time.perf_counter() - started) * 1000.0
+                # Solo la primera página; el resto llega a la tabla al terminar
+                if count <= st.session_state.cards_page_size:
+                    rec = _build_recommendations_frame([value]).to_dict('records')[0]
+                    render_recommendation_card(count, rec)
+            elif kind == "partial":
+                partial = value
+            elif kind == "error":
+                progress.empty()
+                return partial, value, first_rec_ms
+            elif kind == "done":
+                progress.empty()
+                return value, None, first_rec_ms
+    progress.empty()
+    return None, "❌ Error inesperado: respuesta incompleta", first_rec_ms
+
+def stream_available():
+    """Streaming activado por el usuario y anunciado por la API"""
+    if not st.session_state.streaming_enabled or ENGINE_MODE == "embedded":
+        return False
+    healthy = [probe.snapshot() for probe in get_health_probes().values()]
+    healthy = [health for health in healthy if health["state"] == "ok"]
+    # Cada petición puede ir a cualquier réplica: todas deben admitirlo
+    return bool(healthy) and all("stream" in health["capabilities"] for health in healthy)
+
+# ==========================================
+# AUTOCOMPLETADO
+# ==========================================
+def _fold(text):
+    """Normaliza para buscar: sin tildes, sin mayúsculas y sin espacios sobrantes"""
+    text = str(text or "")
+    # El texto ASCII no tiene tildes que quitar (la mayoría del catálogo)
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.split()).casefold()
+
+def _trigrams(folded):
+    padded = f"  {folded} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class CatalogIndex:
+    """Índice en memoria de canciones (prefijos + trigramas) para sugerir búsquedas
+
+    Cada consulta tiene un coste acotado sea cual sea el tamaño del catálogo: se
+    recorren las listas de trigramas de la menos a la más frecuente, saltando
+    las de los trigramas presentes en más de `max_df` del catálogo, hasta
+    `max_scanned` ids, y solo se puntúan los `max_scored` candidatos con más
+    trigramas en común.
+    """
+
+    max_df = 0.05
+    max_scanned = 20000
+    max_scored = 100
+
+    def __init__(self, path, refresh_interval=AUTOCOMPLETE_REFRESH_INTERVAL):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.entries = []  # (name, artist, popularity, folded_name, folded_artist, n_trigrams)
+        self.active = []  # False para entradas que ya no están en la instantánea
+        self.by_key = {}  # (folded_name, folded_artist) -> id de entrada
+        self.postings = {}  # trigrama -> [ids de entrada]
+        self.sorted_names = []  # (folded_name, id) para búsquedas por prefijo
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.refresh(force=True)
+
+    def refresh(self, force=False):
+        """Recarga la instantánea si ha cambiado, indexando solo las canciones nuevas"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.refresh_interval:
+            return
+        self._checked_at = now
+        mtime = os.path.getmtime(self.path)
+        if mtime == self._mtime:
+            return
+        snapshot = self._read_snapshot()
+        with self._lock:
+            seen = set()
+            added = False
+            for name, artist, popularity in snapshot:
+                key = (_fold(name), _fold(artist))
+                seen.add(key)
+                entry_id = self.by_key.get(key)
+                if entry_id is None:
+                    self._add(name, artist, popularity, key)
+                    added = True
+                else:
+                    self.active[entry_id] = True
+            for key, entry_id in self.by_key.items():
+                if key not in seen:
+                    self.active[entry_id] = False
+            if added:
+                # Una sola ordenación por recarga (insertar ordenado cada entrada sería cuadrático)
+                self.sorted_names.sort()
+            self._mtime = mtime
+
+    def _read_snapshot(self):
+        if self.path.endswith(".parquet"):
+            df = pd.read_parquet(self.path, columns=['name', 'artists', 'popularity'])
+        else:
+            df = pd.read_csv(self.path, usecols=lambda c: c in ('name', 'artists', 'popularity'))
+        if 'popularity' not in df.columns:
+            df['popularity'] = 0
+        df = df.dropna(subset=['name'])
+        return zip(df['name'].astype(str), df['artists'].fillna('').astype(str),
+                   pd.to_numeric(df['popularity'], errors='coerce').fillna(0).astype(int))
+
+    def _add(self, name, artist, popularity, key):
+        entry_id = len(self.entries)
+        grams = _trigrams(key[0])
+        self.entries.append((name, artist, int(popularity), key[0], key[1], len(grams)))
+        self.active.append(True)
+        self.by_key[key] = entry_id
+        for gram in grams:
+            self.postings.setdefault(gram, []).append(entry_id)
+        self.sorted_names.append((key[0], entry_id))
+
+    def __len__(self):
+        return sum(self.active)
+
+    def exact(self, song_name, artist_name=""):
+        """(name, artist) del catálogo que coincide con lo escrito, o None
+
+        La coincidencia ignora mayúsculas, acentos y espacios, pero la API no: hay
+        que buscar con el nombre y el artista tal como están en el catálogo. Si
+        varias canciones coinciden se elige la más popular.
+        """
+        folded_name, folded_artist = _fold(song_name), _fold(artist_name)
+        best = None
+        with self._lock:
+            start = bisect.bisect_left(self.sorted_names, (folded_name, -1))
+            for name, entry_id in self.sorted_names[start:]:
+                if name != folded_name:
+                    break
+                entry = self.entries[entry_id]
+                if self.active[entry_id] and folded_artist in entry[4]:
+                    if best is None or entry[2] > best[2]:
+                        best = entry
+        return None if best is None else (best[0], best[1])
+
+    def suggest(self, song_name, artist_name="", limit=AUTOCOMPLETE_LIMIT):
+        """Sugerencias [(name, artist)] ordenadas por parecido, prefijo y popularidad"""
+        folded_name, folded_artist = _fold(song_name), _fold(artist_name)
+        if not folded_name:
+            return []
+        with self._lock:
+            scores = Counter()
+            # Prefijos: cubren consultas cortas en las que los trigramas aportan poco
+            start = bisect.bisect_left(self.sorted_names, (folded_name, -1))
+            for name, entry_id in self.sorted_names[start:start + 200]:
+                if not name.startswith(folded_name):
+                    break
+                scores[entry_id] += 1.0
+            grams = _trigrams(folded_name)
+            # De los trigramas más raros a los más comunes; la lista más rara se usa siempre
+            postings = sorted((self.postings[gram] for gram in grams if gram in self.postings), key=len)
+            max_df = max(1, int(self.max_df * len(self.entries)))
+            budget = self.max_scanned
+            hits = Counter()
+            for ids in postings:
+                if hits and len(ids) > max_df:
+                    break
+                hits.update(ids[:budget])
+                budget -= len(ids)
+                if budget <= 0:
+                    break
+            for entry_id, _ in hits.most_common(self.max_scored):
+                # Jaccard entre los trigramas de la consulta y los del nombre
+                shared = len(grams & _trigrams(self.entries[entry_id][3]))
+                scores[entry_id] += shared / (len(grams) + self.entries[entry_id][5] - shared)
+
+            ranked = []
+            for entry_id, score in scores.items():
+                if not self.active[entry_id]:
+                    continue
+                name, artist, popularity, _, entry_artist, _ = self.entries[entry_id]
+                if folded_artist and folded_artist in entry_artist:
+                    score += 0.5
+                ranked.append((score + popularity / 1000.0, name, artist))
+        return [(name, artist) for _, name, artist in heapq.nlargest(limit, ranked)]
+
+def _autocomplete_snapshot_path():
+    if AUTOCOMPLETE_SNAPSHOT:
+        return AUTOCOMPLETE_SNAPSHOT
+    for filename in ("tracks.parquet", "tracks.csv"):
+        path = os.path.join(CATALOG_DIR, filename)
+        if os.path.exists(path):
+            return path
+    return None
+
+@st.cache_resource
+def get_catalog_index():
+    """Índice de autocompletado compartido; None si no hay instantánea del catálogo"""
+    path = _autocomplete_snapshot_path()
+    if path is None or not os.path.exists(path):
+        return None
+    return CatalogIndex(path)
+
+def suggest_songs(song_name, artist_name=""):
+    """Devuelve (match, suggestions) para lo que ha escrito el usuario
+
+    match es el (name, artist) canónico si la canción está en el catálogo (y
+    entonces no hay sugerencias); None si no lo está o no hay catálogo local.
+    """
+    index = get_catalog_index()
+    if index is None:
+        return None, []
+    try:
+        index.refresh()
+    except OSError:
+        pass
+    match = index.exact(song_name, artist_name)
+    if match is not None:
+        return match, []
+    return None, index.suggest(song_name, artist_name)
+
 # ==========================================
 # INTERFAZ PRINCIPAL
 # ==========================================
-st.markdown('<h1 class="main-title">🎵 Recomendador Musical</h1>', unsafe_allow_html=True)
-st.markdown('<p class="subtitle">Descubre música similar a tus canciones favoritas</p>', unsafe_allow_html=True)
+def render_search_form():
+    """Cabecera y formulario de búsqueda; devuelve (song_name, artist_name, submitted)"""
+    st.markdown('<h1 class="main-title">🎵 Recomendador Musical</h1>', unsafe_allow_html=True)
+    st.markdown('<p class="subtitle">Descubre música similar a tus canciones favoritas</p>', unsafe_allow_html=True)
 
-# Formulario de búsqueda
-with st.form("search_form"):
-    col1, col2 = st.columns([2, 1])
+    # Formulario de búsqueda
+    with st.form("search_form"):
+        col1, col2 = st.columns([2, 1])
     
-    with col1:
-        song_name = st.text_input(
-            "🎸 Nombre de la canción",
-            placeholder="Ej: Bohemian Rhapsody",
-            help="Introduce el nombre de la canción"
-        )
+        with col1:
+            song_name = st.text_input(
+                "🎸 Nombre de la canción",
+                placeholder="Ej: Bohemian Rhapsody",
+                help="Introduce el nombre de la canción"
+            )
     
-    with col2:
-        artist_name = st.text_input(
-            "👤 Artista (opcional)",
-            placeholder="Ej: Queen",
-            help="Ayuda a encontrar la canción exacta"
-        )
+        with col2:
+            artist_name = st.text_input(
+                "👤 Artista (opcional)",
+                placeholder="Ej: Queen",
+                help="Ayuda a encontrar la canción exacta"
+            )
     
-    submitted = st.form_submit_button("🔍 Buscar Recomendaciones", use_container_width=True)
+        submitted = st.form_submit_button("🔍 Buscar Recomendaciones", use_container_width=True)
+
+    return song_name, artist_name, submitted
 
 # ==========================================
 # LÓGICA DE BÚSQUEDA PRINCIPAL
 # ==========================================
-if submitted:
-    if not song_name:
-        st.error("⚠️ Por favor, introduce el nombre de una canción")
-    else:
-        st.session_state.recursion_level = 0
-        with st.spinner("🎵 Buscando recomendaciones..."):
+def run_search(song_name, artist_name=""):
+    """Búsqueda principal: reinicia la exploración con la canción indicada"""
+    st.session_state.recursion_level = 0
+    st.session_state.partial_error = None
+    cancel_prefetch()
+    with st.spinner("🎵 Buscando recomendaciones..."), get_metrics().phase("fetch", 0):
+        if stream_available():
+            data, error, first_rec_ms = stream_search(song_name, artist_name)
+            st.session_state.first_rec_ms = first_rec_ms
+        else:
             data, error = get_recommendations(song_name, artist_name)
-            
-            if data:
-                st.session_state.current_data = data
-            elif error:
-                st.error(error)
-                if "No se encontró" in error:
-                    st.info("💡 Intenta con otro nombre o sin especificar el artista")
-                elif "No se pudo conectar" in error:
-                    st.info("💡 Ejecuta la API con: `python tu_api.py`")
+            st.session_state.first_rec_ms = None
+        
+        if data:
+            st.session_state.graph = ExplorationGraph(song_name, artist_name, data, partial=bool(error))
+            # Respuesta incompleta: se muestra lo recibido y el aviso junto a la tabla
+            st.session_state.partial_error = error
+        elif error:
+            st.error(error)
+            if "No se encontró" in error:
+                st.info("💡 Intenta con otro nombre o sin especificar el artista")
+            elif "No se pudo conectar" in error:
+                st.info("💡 Ejecuta la API con: `python tu_api.py`")
+
+def choose_search(song_name, artist_name=""):
+    """Callback de las sugerencias: la búsqueda se lanza en la siguiente ejecución"""
+    st.session_state.pending_search = (song_name, artist_name)
+
+def handle_search(song_name, artist_name, submitted):
+    """Lanza la búsqueda enviada (o la elegida entre las sugerencias)"""
+    if st.session_state.pending_search:
+        pending_song, pending_artist = st.session_state.pending_search
+        st.session_state.pending_search = None
+        run_search(pending_song, pending_artist)
+    elif submitted:
+        if not song_name:
+            st.error("⚠️ Por favor, introduce el nombre de una canción")
+        else:
+            # Si el catálogo local no tiene esa canción exacta, sugerir en vez de pedir un 404
+            match, suggestions = suggest_songs(song_name, artist_name)
+            if match:
+                run_search(*match)
+            elif suggestions:
+                st.warning(f"🤔 No hay ninguna canción llamada «{song_name}». ¿Quisiste decir...?")
+                for i, (suggested_song, suggested_artist) in enumerate(suggestions):
+                    st.button(
+                        f"🎵 {suggested_song} — {suggested_artist}" if suggested_artist else f"🎵 {suggested_song}",
+                        key=f"suggestion_{i}",
+                        on_click=choose_search,
+                        args=(suggested_song, suggested_artist)
+                    )
+                st.button(
+                    "🔍 Buscar igualmente",
+                    key="suggestion_force",
+                    on_click=choose_search,
+                    args=(song_name, artist_name)
+                )
+            else:
+                run_search(song_name, artist_name)
 
 # ==========================================
 # MOSTRAR RESULTADOS
 # ==========================================
-if st.session_state.current_data:
-    data = st.session_state.current_data
-    
-    # Mostrar canción encontrada
-    st.markdown('<div class="found-song">', unsafe_allow_html=True)
-    st.markdown("### ✅ Canción encontrada")
-    found = data['song_found']
-    st.markdown(f"**🎵 {found['name']}**")
-    st.markdown(f"👤 {found['artist']}")
-    st.markdown(f"📅 Año: {found['year']}")
-    st.markdown('</div>', unsafe_allow_html=True)
+def render_results():
+    """Canción encontrada y niveles de exploración de la búsqueda actual"""
+    if st.session_state.graph:
+        graph = st.session_state.graph
     
-    # Mostrar recomendaciones
-    st.markdown('<h2 class="rec-title">🎯 Recomendaciones para ti:</h2>', unsafe_allow_html=True)
+        # Mostrar canción encontrada
+        render_found_song(graph.root.data['song_found'])
     
-    # Mostrar tabla y obtener selección
-    selected_song = display_recommendations_table(data, key_suffix="main")
+        # Mostrar recomendaciones
+        st.markdown('<h2 class="rec-title">🎯 Recomendaciones para ti:</h2>', unsafe_allow_html=True)
+        if st.session_state.partial_error:
+            st.warning(f"⚠️ Resultados incompletos. {st.session_state.partial_error}")
     
-    # Si se seleccionó una canción, buscar automáticamente
-    if selected_song:
-        st.markdown('<div class="nested-rec">', unsafe_allow_html=True)
-        st.markdown(f"### 🔄 Recomendaciones basadas en: **{selected_song['name']}**")
-        st.markdown(f"**Artista:** {selected_song['artists']}")
-        
-        with st.spinner("🎵 Cargando recomendaciones..."):
-            nested_data, nested_error = get_recommendations(selected_song['name'], selected_song['artists'])
-            
-            if nested_data:
-                # Mostrar canción encontrada para la selección
-                st.markdown("---")
-                nested_found = nested_data['song_found']
-                st.markdown(f"✅ **{nested_found['name']}** - {nested_found['artist']} ({nested_found['year']})")
-                
-                # Mostrar recomendaciones anidadas
-                selected_nested = display_recommendations_table(nested_data, key_suffix="nested")
-                
-                # Tercer nivel de recomendaciones
-                if selected_nested:
-                    st.markdown("---")
-                    st.markdown(f"### 🔄🔄 Explorando: **{selected_nested['name']}**")
-                    
-                    with st.spinner("🎵 Cargando más recomendaciones..."):
-                        third_data, third_error = get_recommendations(selected_nested['name'], selected_nested['artists'])
-                        
-                        if third_data:
-                            third_found = third_data['song_found']
-                            st.markdown(f"✅ **{third_found['name']}** - {third_found['artist']}")
-                            display_recommendations_table(third_data, key_suffix="third")
-                        elif third_error:
-                            st.error(third_error)
-            
-            elif nested_error:
-                st.error(nested_error)
-        
-        st.markdown('</div>', unsafe_allow_html=True)
+        # Mostrar tabla; cada nivel es un fragmento que se reejecuta por separado
+        render_level(0)
 
 # ==========================================
 # INFORMACIÓN ADICIONAL
 # ==========================================
-with st.sidebar:
-    st.markdown("### ℹ️ Información")
-    st.markdown("""
-    Esta aplicación utiliza Machine Learning (KNN) 
-    para recomendar canciones similares basándose en 
-    características musicales como:
+def render_sidebar():
+    """Información, estado del sistema y opciones en la barra lateral"""
+    with st.sidebar:
+        st.markdown("### ℹ️ Información")
+        st.markdown("""
+        Esta aplicación utiliza Machine Learning (KNN) 
+        para recomendar canciones similares basándose en 
+        características musicales como:
     
-    - 🎼 Tempo
-    - 🎹 Tonalidad
-    - 🔊 Energía
-    - 💃 Bailabilidad
-    - 🎤 Acústica
-    - Y más...
-    """)
+        - 🎼 Tempo
+        - 🎹 Tonalidad
+        - 🔊 Energía
+        - 💃 Bailabilidad
+        - 🎤 Acústica
+        - Y más...
+        """)
     
-    st.markdown("---")
-    st.markdown("### 🚀 Cómo usar")
-    st.markdown("""
-    1. Escribe el nombre de una canción
-    2. (Opcional) Añade el artista
-    3. Haz clic en buscar
-    4. **¡Verás un gráfico de similitud!**
-    5. Haz clic en cualquier fila de la tabla
-    6. ¡Puedes explorar hasta 3 niveles!
-    """)
+        st.markdown("---")
+        st.markdown("### 🚀 Cómo usar")
+        st.markdown("""
+        1. Escribe el nombre de una canción
+        2. (Opcional) Añade el artista
+        3. Haz clic en buscar
+        4. **¡Verás un gráfico de similitud!**
+        5. Haz clic en cualquier fila de la tabla
+        6. ¡Sigue explorando tantos niveles como quieras!
+        """)
     
-    st.markdown("---")
-    st.markdown("### 🔧 Estado del sistema")
-    try:
-        health = requests.get("http://127.0.0.1:8000/", timeout=2)
-        if health.status_code == 200:
-            st.success("✅ API conectada")
+        st.markdown("---")
+        st.markdown("### 🔧 Estado del sistema")
+        if ENGINE_MODE == "embedded":
+            try:
+                engine = get_embedded_engine()
+                st.success(f"🧠 Motor KNN integrado ({len(engine.rows)} canciones)")
+            except Exception as e:
+                st.error(_error_for_engine(e))
         else:
-            st.warning("⚠️ API responde con errores")
-    except:
-        st.error("❌ API desconectada")
\ No newline at end of file
+            with get_metrics().phase("health"):
+                probes = get_health_probes()
+                snapshots = [probes[url].snapshot() for url in API_REPLICA_URLS]
+                replicas = get_api_client().pool.snapshot()
+            breaker_labels = {"closed": "", "open": " · 🔌 disyuntor abierto", "half_open": " · 🔌 disyuntor semiabierto"}
+            if len(snapshots) == 1:
+                health = snapshots[0]
+                if health["state"] is None:
+                    st.info("⏳ Comprobando la API...")
+                else:
+                    if health["state"] == "ok":
+                        st.success("✅ API conectada")
+                    elif health["state"] == "error":
+                        st.warning(f"⚠️ API responde con errores ({health['status_code']})")
+                    else:
+                        st.error("❌ API desconectada")
+                    st.caption(
+                        f"⏱️ Latencia: {health['latency_ms']:.0f} ms · "
+                        f"comprobado hace {health['age_s']:.0f} s"
+                        f"{breaker_labels[replicas[0]['breaker']]}"
+                    )
+            else:
+                up = sum(health["state"] == "ok" for health in snapshots)
+                if up == len(snapshots):
+                    st.success(f"✅ {up}/{len(snapshots)} réplicas conectadas")
+                elif up:
+                    st.warning(f"⚠️ {up}/{len(snapshots)} réplicas conectadas")
+                else:
+                    st.error("❌ Ninguna réplica de la API conectada")
+                for health, replica in zip(snapshots, replicas):
+                    icon = {"ok": "🟢", "error": "🟠", "down": "🔴"}.get(health["state"], "⏳")
+                    latency = f"{health['latency_ms']:.0f} ms" if health["latency_ms"] is not None else "—"
+                    st.caption(
+                        f"{icon} {replica['url']} · {latency} · {replica['outstanding']} en curso"
+                        f"{breaker_labels[replica['breaker']]}"
+                    )
+
+        cache_stats = get_response_cache().stats()
+        st.checkbox(
+            "⚡ Precargar recomendaciones",
+            key="prefetch_enabled",
+            help=f"Descarga en segundo plano las recomendaciones de las {PREFETCH_TOP_N} primeras filas de cada tabla"
+        )
+        st.checkbox(
+            "📡 Resultados progresivos",
+            key="streaming_enabled",
+            help="Muestra las recomendaciones según llegan si la API admite streaming"
+        )
+        if st.session_state.get('first_rec_ms') is not None:
+            st.caption(f"⚡ Primera recomendación en {st.session_state.first_rec_ms:.0f} ms")
+        st.selectbox(
+            "🃏 Tarjetas por página",
+            CARDS_PAGE_SIZE_OPTIONS,
+            key="cards_page_size"
+        )
+        if st.session_state.prefetch_batch is not None and st.session_state.prefetch_batch.pending():
+            st.caption(f"⏳ Precargas pendientes: {st.session_state.prefetch_batch.pending()}")
+        st.caption(
+            f"🗃️ Caché: {cache_stats['entries']} entradas · "
+            f"{cache_stats['hits']} aciertos / {cache_stats['misses']} fallos "
+            f"({cache_stats['hit_ratio']:.0%})"
+        )
+        graph = st.session_state.graph
+        if graph is not None:
+            st.caption(
+                f"🧠 Memoria de la sesión: {graph.nbytes / 1024:.0f} KB de {graph.max_bytes / 1024:.0f} KB · "
+                f"{len(graph.nodes)} nodos"
+            )
+        st.checkbox("🐞 Panel de depuración", key="debug_panel")
+
+# ==========================================
+# INSTRUMENTACIÓN
+# ==========================================
+def render_debug_panel(last_rerun):
+    """Tiempos de la última ejecución y métricas del proceso"""
+    if not st.session_state.debug_panel or last_rerun is None:
+        return
+    metrics = get_metrics()
+    with st.sidebar.expander("🐞 Tiempos de la última ejecución", expanded=True):
+        st.markdown(f"**Total:** {last_rerun['total_ms']:.1f} ms")
+        p50 = metrics.quantile("recommender_rerun_seconds", 0.50, (("kind", "full"),))
+        p99 = metrics.quantile("recommender_rerun_seconds", 0.99, (("kind", "full"),))
+        if p50 is not None:
+            st.caption(f"Ejecuciones completas del proceso: p50 {p50 * 1000:.0f} ms · p99 {p99 * 1000:.0f} ms")
+        if last_rerun['phases']:
+            st.dataframe(pd.DataFrame(last_rerun['phases']).round(2), hide_index=True, use_container_width=True)
+        if last_rerun['requests']:
+            st.dataframe(pd.DataFrame(last_rerun['requests']).round(2), hide_index=True, use_container_width=True)
+        st.download_button(
+            "⬇️ Métricas (Prometheus)",
+            metrics.to_prometheus(cache_gauges()),
+            file_name="recommender_metrics.prom",
+            mime="text/plain"
+        )
+
+def main():
+    init_session_state()
+    with measured_rerun("full") as record:
+        st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
+        song_name, artist_name, submitted = render_search_form()
+        handle_search(song_name, artist_name, submitted)
+        render_results()
+        render_sidebar()
+    render_debug_panel(record)
+
+# Streamlit ejecuta el script como __main__; al importarlo (benchmarks, lotes) no se pinta nada
+if __name__ == "__main__":
+    main()
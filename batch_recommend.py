@@ -0,0 +1,317 @@
+"""
+Recomendaciones por lotes sin interfaz: de un fichero de semillas a Parquet.
+
+Lee las semillas de un CSV o Parquet (columna con la canción y, opcionalmente,
+el artista), pide sus recomendaciones con el mismo `get_recommendations` que
+la interfaz (API con réplicas y caché, o motor integrado, según el entorno) y
+escribe el resultado bloque a bloque en un directorio Parquet, así que la
+memoria no crece con el tamaño del fichero. Si el trabajo se interrumpe, al
+relanzarlo continúa desde el último bloque completado.
+
+Uso:
+    python batch_recommend.py semillas.csv --output recomendaciones/
+    python batch_recommend.py semillas.parquet -o recomendaciones/ --concurrency 16 --rate 50
+    RECOMMENDER_ENGINE=embedded python batch_recommend.py semillas.csv -o recomendaciones/
+
+El resultado se lee con `pd.read_parquet("recomendaciones/")`: una fila por
+recomendación (rank 1..k) y una fila con `error` por cada semilla sin resultado.
+"""
+import argparse
+import fnmatch
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+SONG_COLUMNS = ("song_name", "song", "name", "track")
+ARTIST_COLUMNS = ("artist_name", "artist", "artists")
+CHECKPOINT_NAME = "_checkpoint.json"
+# Lo único que escribe un trabajo en su directorio de salida (lo que borra --restart)
+OUTPUT_PATTERNS = ("part-*.parquet", ".part-*.tmp", CHECKPOINT_NAME, f"{CHECKPOINT_NAME}.tmp")
+
+# ==========================================
+# ESQUEMA DE SALIDA
+# ==========================================
+# Fijo para que todos los bloques se puedan leer juntos como un único dataset
+OUTPUT_SCHEMA = pa.schema([
+    ("seed_index", pa.int64()),
+    ("seed_song", pa.string()),
+    ("seed_artist", pa.string()),
+    ("found_name", pa.string()),
+    ("found_artist", pa.string()),
+    ("rank", pa.int64()),
+    ("name", pa.string()),
+    ("artists", pa.string()),
+    ("year", pa.int64()),
+    ("popularity", pa.int64()),
+    ("cluster_type", pa.string()),
+    ("cluster_id", pa.string()),
+    ("cluster_features", pa.string()),
+    ("similarity_pct", pa.float64()),
+    ("similarity_percentage", pa.float64()),
+    ("similarity_score", pa.float64()),
+    ("similarity_distance", pa.float64()),
+    ("danceability", pa.float64()),
+    ("energy", pa.float64()),
+    ("valence", pa.float64()),
+    ("acousticness", pa.float64()),
+    ("speechiness", pa.float64()),
+    ("error", pa.string()),
+])
+
+# ==========================================
+# LECTURA DE SEMILLAS
+# ==========================================
+def _seed_columns(frame):
+    """Normaliza un bloque de semillas a las columnas song_name / artist_name"""
+    columns = {column.lower(): column for column in frame.columns}
+    song = next((columns[c] for c in SONG_COLUMNS if c in columns), None)
+    if song is None:
+        raise ValueError(f"El fichero de semillas necesita una columna {' / '.join(SONG_COLUMNS)}")
+    artist = next((columns[c] for c in ARTIST_COLUMNS if c in columns), None)
+    seeds = pd.DataFrame({"song_name": frame[song]})
+    seeds["artist_name"] = frame[artist] if artist is not None else ""
+    return seeds.fillna("").astype(str)
+
+def read_seed_chunks(path, chunk_size):
+    """Bloques de semillas sin cargar el fichero entero (mismo troceado en cada ejecución)"""
+    if path.lower().endswith((".parquet", ".pq")):
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield _seed_columns(batch.to_pandas())
+    else:
+        for frame in pd.read_csv(path, chunksize=chunk_size, dtype=str, keep_default_na=False):
+            yield _seed_columns(frame)
+
+def count_seeds(path):
+    """Número de semillas (aproximado en CSV con saltos de línea entrecomillados)"""
+    if path.lower().endswith((".parquet", ".pq")):
+        return pq.ParquetFile(path).metadata.num_rows
+    with open(path, "rb") as f:
+        return max(0, sum(1 for _ in f) - 1)
+
+# ==========================================
+# PUNTO DE CONTROL
+# ==========================================
+def input_fingerprint(path, chunk_size):
+    stat = os.stat(path)
+    return {"input": os.path.abspath(path), "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns, "chunk_size": chunk_size}
+
+class Checkpoint:
+    """Bloques ya escritos; se guarda de forma atómica tras cada bloque"""
+
+    def __init__(self, directory, fingerprint):
+        self.path = os.path.join(directory, CHECKPOINT_NAME)
+        self.fingerprint = fingerprint
+        self.completed = {}  # nº de bloque (str) -> {"seeds", "rows", "errors"}
+
+    def load(self):
+        """Carga el punto de control; falla si es de otro fichero u otro tamaño de bloque"""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("fingerprint") != self.fingerprint:
+            raise ValueError(
+                f"{self.path} corresponde a otro fichero de semillas o tamaño de bloque; "
+                "usa --restart para empezar de cero"
+            )
+        self.completed = state.get("completed", {})
+        return True
+
+    def done(self, chunk):
+        return str(chunk) in self.completed
+
+    def mark(self, chunk, seeds, rows, errors):
+        self.completed[str(chunk)] = {"seeds": seeds, "rows": rows, "errors": errors}
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": self.fingerprint, "completed": self.completed}, f)
+        os.replace(tmp, self.path)
+
+# ==========================================
+# PETICIONES
+# ==========================================
+class RateLimiter:
+    """Cubo de fichas compartido por los hilos: como mucho `rate` semillas por segundo"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def fetch(app, limiter, song_name, artist_name, attempts):
+    """(data, error) de una semilla; los errores transitorios se reintentan con espera"""
+    for attempt in range(attempts):
+        limiter.acquire()
+        data, error = app.get_recommendations(song_name, artist_name)
+        # Una canción inexistente no va a aparecer por reintentar
+        if data or (error and "No se encontró" in error) or attempt == attempts - 1:
+            return data, error
+        time.sleep(min(10.0, 0.5 * 2 ** attempt))
+
+def seed_frame(app, index, song_name, artist_name, data, error):
+    """Filas de salida de una semilla: una por recomendación o una con el error"""
+    if not data:
+        return pd.DataFrame({"seed_index": [index], "seed_song": [song_name],
+                             "seed_artist": [artist_name], "error": [error or "Sin resultado"]})
+    frame = app._build_recommendations_frame(data['recommendations'])
+    text_columns = [c for c in app.TEXT_COLUMNS if c in frame.columns]
+    frame[text_columns] = frame[text_columns].astype(str)
+    found = data.get('song_found') or {}
+    frame.insert(0, "seed_index", index)
+    frame.insert(1, "seed_song", song_name)
+    frame.insert(2, "seed_artist", artist_name)
+    frame.insert(3, "found_name", str(found.get('name', '')))
+    frame.insert(4, "found_artist", str(found.get('artist', '')))
+    frame.insert(5, "rank", range(1, len(frame) + 1))
+    return frame
+
+def write_chunk(directory, chunk, frame):
+    """Escribe el bloque en part-NNNNN.parquet (primero en un temporal oculto)"""
+    frame = frame.reindex(columns=OUTPUT_SCHEMA.names)
+    table = pa.Table.from_pandas(frame, schema=OUTPUT_SCHEMA, preserve_index=False)
+    path = os.path.join(directory, f"part-{chunk:05d}.parquet")
+    # Los ficheros que empiezan por "." o "_" no forman parte del dataset al leerlo
+    tmp = os.path.join(directory, f".part-{chunk:05d}.parquet.tmp")
+    pq.write_table(table, tmp, compression="zstd")
+    os.replace(tmp, path)
+
+def clear_output(directory):
+    """Borra los bloques y el punto de control de un trabajo anterior (--restart)
+
+    Falla sin borrar nada si el directorio contiene cualquier otra cosa: puede
+    ser un directorio equivocado y no se debe vaciar.
+    """
+    entries = os.listdir(directory)
+    foreign = [
+        name for name in entries
+        if not os.path.isfile(os.path.join(directory, name))
+        or not any(fnmatch.fnmatchcase(name, pattern) for pattern in OUTPUT_PATTERNS)
+    ]
+    if foreign:
+        shown = ", ".join(sorted(foreign)[:5]) + (", ..." if len(foreign) > 5 else "")
+        raise ValueError(f"{directory} contiene ficheros que no son de este trabajo ({shown}); "
+                         "no se borra nada con --restart")
+    for name in entries:
+        os.remove(os.path.join(directory, name))
+
+def _duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s" if hours else f"{minutes}m{seconds:02d}s"
+
+# ==========================================
+# PROGRAMA PRINCIPAL
+# ==========================================
+def run(app, args):
+    if args.restart and os.path.isdir(args.output):
+        clear_output(args.output)
+    os.makedirs(args.output, exist_ok=True)
+    checkpoint = Checkpoint(args.output, input_fingerprint(args.seeds, args.chunk_size))
+    if checkpoint.load():
+        print(f"↩️  Reanudando: {len(checkpoint.completed)} bloques ya completados en {args.output}")
+
+    total = count_seeds(args.seeds)
+    limiter = RateLimiter(args.rate, burst=args.concurrency)
+    processed = sum(c["seeds"] for c in checkpoint.completed.values())
+    fetched = rows = errors = 0
+    started = time.perf_counter()
+    offset = 0
+
+    def job(seed):
+        index, song_name, artist_name = seed
+        data, error = fetch(app, limiter, song_name, artist_name, args.attempts)
+        return seed_frame(app, index, song_name, artist_name, data, error)
+
+    executor = ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="batch")
+    try:
+        for chunk, seeds in enumerate(read_seed_chunks(args.seeds, args.chunk_size)):
+            indexed = [(offset + i, song, artist)
+                       for i, (song, artist) in enumerate(zip(seeds["song_name"], seeds["artist_name"]))]
+            offset += len(seeds)
+            if checkpoint.done(chunk):
+                continue
+
+            frames = list(executor.map(job, indexed))
+            frame = pd.concat(frames, ignore_index=True)
+            chunk_errors = int(frame["error"].notna().sum()) if "error" in frame else 0
+            chunk_rows = len(frame) - chunk_errors
+            write_chunk(args.output, chunk, frame)
+            checkpoint.mark(chunk, len(indexed), chunk_rows, chunk_errors)
+
+            fetched += len(indexed)
+            processed += len(indexed)
+            rows += chunk_rows
+            errors += chunk_errors
+            elapsed = time.perf_counter() - started
+            rate = fetched / elapsed if elapsed > 0 else 0.0
+            progress = f"{processed}/{total} ({processed / total:.0%})" if total else str(processed)
+            eta = f" · quedan ~{_duration((total - processed) / rate)}" if total and rate else ""
+            print(f"✅ Bloque {chunk}: {len(indexed)} semillas, {chunk_rows} filas, {chunk_errors} errores · "
+                  f"{progress} · {rate:.1f} semillas/s{eta}", flush=True)
+    except KeyboardInterrupt:
+        executor.shutdown(wait=False, cancel_futures=True)
+        print(f"\n⏸️  Interrumpido: {len(checkpoint.completed)} bloques guardados; "
+              "vuelve a lanzar el mismo comando para continuar")
+        return 130
+    executor.shutdown()
+
+    elapsed = time.perf_counter() - started
+    print(f"🎵 {fetched} semillas en {_duration(elapsed)} ({fetched / elapsed if elapsed else 0:.1f} semillas/s): "
+          f"{rows} recomendaciones, {errors} errores → {args.output}")
+    return 0
+
+def positive_int(text):
+    """Tipo de argparse para enteros >= 1"""
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"debe ser un entero mayor que 0: {text}")
+    return value
+
+def main():
+    parser = argparse.ArgumentParser(description="Recomendaciones por lotes de un fichero de semillas a Parquet")
+    parser.add_argument("seeds", help="CSV o Parquet con la canción (song_name) y opcionalmente el artista (artist_name)")
+    parser.add_argument("-o", "--output", required=True, help="Directorio Parquet de salida")
+    parser.add_argument("--chunk-size", type=positive_int, default=1000, help="Semillas por bloque (y por fichero de salida)")
+    parser.add_argument("--concurrency", type=positive_int, default=8, help="Peticiones simultáneas")
+    parser.add_argument("--rate", type=float, default=0.0, help="Máximo de semillas por segundo (0 = sin límite)")
+    parser.add_argument("--attempts", type=positive_int, default=3, help="Intentos por semilla ante errores transitorios")
+    parser.add_argument("--restart", action="store_true", help="Borra los bloques y el punto de control y empieza de cero")
+    args = parser.parse_args()
+
+    # Sin servidor de Streamlit los elementos se ejecutan en modo "bare" y avisan en cada llamada
+    logging.disable(logging.WARNING)
+    import Stramlit_frontend as app
+
+    try:
+        sys.exit(run(app, args))
+    except ValueError as e:
+        sys.exit(f"❌ {e}")
+
+
+if __name__ == "__main__":
+    main()
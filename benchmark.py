@@ -0,0 +1,336 @@
+"""
+Banco de pruebas sin conexión del recomendador.
+
+Arranca una API de sustitución (mock_api.py) con latencia, tamaño de
+respuesta y tasa de errores configurables, simula muchas sesiones
+concurrentes que hacen búsqueda → exploración → exploración con el mismo
+código que usa la interfaz, y mide por separado lo que cuesta pintar una
+tabla de recomendaciones y su gráfico según el número de recomendaciones.
+
+Informa del rendimiento (sesiones/s y peticiones/s), de los percentiles de
+latencia de cada paso y de la memoria retenida por sesión.
+
+Uso:
+    python benchmark.py --sessions 200 --concurrency 16 --latency 40 --jitter 20
+    python benchmark.py --error-rate 0.05 --k 50 --no-cache
+    python benchmark.py --skip-load --sizes 10,100,1000      # solo micro-benchmarks
+    python benchmark.py --replicas 3 --jitter 200             # balanceo y hedging entre réplicas
+    python benchmark.py --api-url http://127.0.0.1:8000      # contra una API ya arrancada
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import random
+import statistics
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import mock_api
+
+# ==========================================
+# UTILIDADES
+# ==========================================
+def percentile(values, q):
+    """Percentil por el método del rango más cercano (None si no hay valores)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+def summarize(samples):
+    """Resumen en milisegundos de una lista de duraciones en segundos"""
+    return {
+        "n": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000 if samples else None,
+        "p50_ms": _ms(percentile(samples, 0.50)),
+        "p95_ms": _ms(percentile(samples, 0.95)),
+        "p99_ms": _ms(percentile(samples, 0.99)),
+        "max_ms": _ms(max(samples) if samples else None),
+    }
+
+def _ms(value):
+    return None if value is None else value * 1000
+
+def print_table(title, rows, columns):
+    """Tabla de texto alineada; `rows` es una lista de dicts"""
+    print(f"\n{title}")
+    widths = {c: max(len(c), *(len(_fmt(r.get(c))) for r in rows)) for c in columns}
+    print("  ".join(c.rjust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(_fmt(row.get(c)).rjust(widths[c]) for c in columns))
+
+def _fmt(value):
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
+
+def _serve_mock(ports, tracks, k, latency, jitter, error_rate):
+    # Sin streaming: las sesiones simuladas usan /recommend (con sus formatos binarios)
+    capabilities = tuple(c for c in mock_api.default_capabilities() if c != "stream")
+    server = mock_api.make_server(port=0, tracks=tracks, k=k, capabilities=capabilities,
+                                  latency=latency, jitter=jitter, error_rate=error_rate)
+    ports.put(server.server_port)
+    server.serve_forever()
+
+def start_mock_server(args):
+    """Arranca la API de sustitución en otro proceso (no compite por el GIL con las sesiones)"""
+    ports = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=_serve_mock,
+        args=(ports, args.tracks, args.k, args.latency / 1000.0, args.jitter / 1000.0, args.error_rate),
+        daemon=True,
+    )
+    process.start()
+    return process, f"http://127.0.0.1:{ports.get(timeout=60)}"
+
+# ==========================================
+# SESIONES SIMULADAS
+# ==========================================
+def simulate_session(app, seed, depth, rng):
+    """Búsqueda seguida de `depth` exploraciones; devuelve (grafo, tiempos, errores)"""
+    timings = []
+    errors = 0
+    name, artist = seed
+
+    started = time.perf_counter()
+    data, error = app.get_recommendations(name, artist)
+    timings.append(("search", time.perf_counter() - started))
+    if not data:
+        return None, timings, 1
+
+    graph = app.ExplorationGraph(name, artist, data)
+    app.normalize_recommendations(graph.root.data['recommendations'])
+    for level in range(depth):
+        node = graph.node_at(level)
+        # Solo canciones fuera de la rama (elegir un ancestro vuelve a su nivel)
+        candidates = [rec for rec in node.data['recommendations']
+                      if app.normalize_seed(rec['name'], rec['artists']) not in graph.path]
+        if not candidates:
+            break
+        selected = rng.choice(candidates)
+        child = graph.select(level, selected['name'], selected['artists'])
+        if child is None:
+            break
+        started = time.perf_counter()
+        child_data, child_error = app.get_recommendations(child.song_name, child.artist_name)
+        timings.append((f"drill_{level + 1}", time.perf_counter() - started))
+        if not child_data:
+            errors += 1
+            break
+        child_data = graph.attach(child, child_data)
+        if child_data is None:
+            # Presupuesto de memoria de la sesión agotado: no se baja más
+            break
+        app.normalize_recommendations(child_data['recommendations'])
+    return graph, timings, errors
+
+def _session_seeds(args, count, offset=0):
+    catalog = mock_api.build_catalog(args.tracks)
+    rng = random.Random(args.seed + offset)
+    return [(t['name'], t['artists']) for t in rng.choices(catalog, k=count)]
+
+def run_load(app, args):
+    """Lanza `sessions` sesiones con `concurrency` hilos y mide rendimiento y latencias"""
+    seeds = _session_seeds(args, args.sessions)
+    # Calentamiento (conexiones, sondas de salud, decodificadores) con una canción fuera de la carga
+    chosen = set(seeds)
+    warmup = next(((t['name'], t['artists']) for t in mock_api.build_catalog(args.tracks)
+                   if (t['name'], t['artists']) not in chosen), None)
+    if warmup is not None:
+        app.get_recommendations(*warmup)
+    steps = {}
+    sessions = []
+    errors = 0
+
+    def one(index):
+        session_started = time.perf_counter()
+        result = simulate_session(app, seeds[index], args.depth, random.Random(args.seed + index))
+        return result, time.perf_counter() - session_started
+
+    wall_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for (_, timings, failed), elapsed in executor.map(one, range(args.sessions)):
+            sessions.append(elapsed)
+            errors += failed
+            for step, seconds in timings:
+                steps.setdefault(step, []).append(seconds)
+    wall = time.perf_counter() - wall_started
+
+    requests_made = sum(len(samples) for samples in steps.values())
+    cache = app.get_response_cache().stats()
+    return {
+        "sessions": args.sessions,
+        "concurrency": args.concurrency,
+        "wall_s": wall,
+        "sessions_per_s": args.sessions / wall,
+        "requests_per_s": requests_made / wall,
+        "errors": errors,
+        "steps": {step: summarize(samples) for step, samples in steps.items()},
+        "session": summarize(sessions),
+        "cache": cache,
+    }
+
+def run_memory(app, args):
+    """Memoria retenida por sesión: grafos vivos, respuestas, DataFrames y su parte de la caché
+
+    Se mide aparte y en serie porque tracemalloc ralentiza mucho las asignaciones.
+    """
+    seeds = _session_seeds(args, args.memory_sessions, offset=1)
+    app.get_response_cache().clear()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    # Se conservan los grafos como haría session_state mientras la sesión sigue abierta
+    graphs = [
+        simulate_session(app, seed, args.depth, random.Random(args.seed + index))[0]
+        for index, seed in enumerate(seeds)
+    ]
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    alive = [graph for graph in graphs if graph is not None]
+    return {
+        "sessions": len(graphs),
+        "per_session_kb": (retained - baseline) / max(1, len(alive)) / 1024,
+        "peak_mb": (peak - baseline) / 1024 / 1024,
+        # Lo que cada sesión carga a su presupuesto (respuestas compartidas contadas enteras)
+        "session_budget_kb": statistics.fmean(g.nbytes for g in alive) / 1024 if alive else 0.0,
+        "payload_store": app.get_payload_store().stats(),
+    }
+
+# ==========================================
+# MICRO-BENCHMARKS DE RENDERIZADO
+# ==========================================
+def _time_calls(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+def run_render(app, args):
+    """Tabla y gráfico en frío (respuesta nueva, caché vacía) y en caliente"""
+    app.init_session_state()
+    app.st.session_state.prefetch_enabled = False
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    recommender = mock_api.Recommender(mock_api.build_catalog(max(args.tracks, max(sizes) + 1)))
+
+    rows = []
+    for size in sizes:
+        _, payload = recommender.recommend("Bohemian Rhapsody", "Queen", k=size)
+        encoded = json.dumps(payload)
+
+        def table_cold():
+            # Una respuesta nueva no está en la caché de DataFrames ni en la de gráficos
+            app._build_similarity_chart.clear()
+            app.display_recommendations_table(json.loads(encoded), key_suffix=f"bench_{size}")
+
+        def table_warm():
+            app.display_recommendations_table(payload, key_suffix=f"bench_{size}")
+
+        frame = app.normalize_recommendations(payload['recommendations'])
+
+        def chart_cold():
+            app._build_similarity_chart.clear()
+            app.create_similarity_chart(frame)
+
+        def chart_warm():
+            app.create_similarity_chart(frame)
+
+        for name, fn in (("table_cold", table_cold), ("table_warm", table_warm),
+                         ("chart_cold", chart_cold), ("chart_warm", chart_warm)):
+            fn()  # calentamiento (imports perezosos de plotly/pandas)
+            stats = summarize(_time_calls(fn, args.repeat))
+            rows.append({"recs": size, "case": name, **stats})
+    return rows
+
+# ==========================================
+# PROGRAMA PRINCIPAL
+# ==========================================
+def main():
+    parser = argparse.ArgumentParser(description="Banco de pruebas del recomendador")
+    parser.add_argument("--api-url", help="API ya arrancada (por defecto se arranca mock_api en un puerto libre)")
+    parser.add_argument("--replicas", type=int, default=1, help="Réplicas de mock_api que se arrancan")
+    parser.add_argument("--sessions", type=int, default=200, help="Sesiones simuladas")
+    parser.add_argument("--concurrency", type=int, default=16, help="Sesiones simultáneas")
+    parser.add_argument("--depth", type=int, default=2, help="Exploraciones tras la búsqueda")
+    parser.add_argument("--tracks", type=int, default=5000, help="Tamaño del catálogo sintético")
+    parser.add_argument("--k", type=int, default=10, help="Recomendaciones por respuesta (tamaño del payload)")
+    parser.add_argument("--latency", type=float, default=20.0, help="Milisegundos de latencia fija de la API")
+    parser.add_argument("--jitter", type=float, default=10.0, help="Milisegundos de latencia aleatoria adicional")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de respuestas 503")
+    parser.add_argument("--memory-sessions", type=int, default=50, help="Sesiones de la medida de memoria")
+    parser.add_argument("--formats", help="Formatos aceptados por el cliente, p. ej. json o arrow,json")
+    parser.add_argument("--no-cache", action="store_true", help="Desactiva la caché de respuestas compartida")
+    parser.add_argument("--sizes", default="10,50,200,1000", help="Nº de recomendaciones de los micro-benchmarks")
+    parser.add_argument("--repeat", type=int, default=20, help="Repeticiones por micro-benchmark")
+    parser.add_argument("--skip-load", action="store_true", help="No simular sesiones")
+    parser.add_argument("--skip-render", action="store_true", help="No medir tabla ni gráfico")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", metavar="PATH", help="Guarda también los resultados en JSON")
+    args = parser.parse_args()
+
+    servers = []
+    if args.api_url:
+        api_url = args.api_url
+    else:
+        for _ in range(max(1, args.replicas)):
+            servers.append(start_mock_server(args))
+        api_url = ",".join(url for _, url in servers)
+    # La configuración del frontend se lee al importarlo
+    os.environ["RECOMMENDER_API_URLS"] = api_url
+    os.environ["RECOMMENDER_PREFETCH"] = "0"
+    if args.formats:
+        os.environ["RECOMMENDER_RESPONSE_FORMATS"] = args.formats
+    if args.no_cache:
+        os.environ["RECOMMENDER_CACHE_TTL"] = "0"
+        os.environ["RECOMMENDER_CACHE_NEGATIVE_TTL"] = "0"
+    # Sin servidor de Streamlit los elementos se ejecutan en modo "bare" y avisan en cada llamada
+    logging.disable(logging.WARNING)
+    import Stramlit_frontend as app
+
+    results = {"api_url": api_url, "k": args.k, "formats": app.response_media_types(), "latency_ms": args.latency,
+               "jitter_ms": args.jitter, "error_rate": args.error_rate}
+    try:
+        if not args.skip_load:
+            load = run_load(app, args)
+            results["load"] = load
+            print(f"🎵 {load['sessions']} sesiones ({load['concurrency']} simultáneas) contra {api_url} "
+                  f"en {load['wall_s']:.2f} s")
+            print(f"   {load['sessions_per_s']:.1f} sesiones/s · {load['requests_per_s']:.1f} peticiones/s · "
+                  f"{load['errors']} errores")
+            print(f"   Caché: {load['cache']['entries']} entradas, {load['cache']['hit_ratio']:.0%} aciertos")
+            print_table("Latencia por paso (ms)",
+                        [{"paso": step, **stats} for step, stats in load['steps'].items()]
+                        + [{"paso": "sesión", **load['session']}],
+                        ["paso", "n", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"])
+
+            memory = run_memory(app, args)
+            results["memory"] = memory
+            print(f"\n💾 Memoria retenida: {memory['per_session_kb']:.1f} KB/sesión "
+                  f"({memory['sessions']} sesiones, pico {memory['peak_mb']:.1f} MB) · "
+                  f"presupuesto usado {memory['session_budget_kb']:.1f} KB/sesión · "
+                  f"almacén {memory['payload_store']['entries']} respuestas, "
+                  f"{memory['payload_store']['bytes'] / 1024:.0f} KB")
+
+        if not args.skip_render:
+            render = run_render(app, args)
+            results["render"] = render
+            print_table("Renderizado por nº de recomendaciones (ms)", render,
+                        ["recs", "case", "n", "mean_ms", "p50_ms", "p95_ms", "p99_ms"])
+    finally:
+        for process, _ in servers:
+            process.terminate()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
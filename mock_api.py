@@ -0,0 +1,442 @@
+"""
+Servidor local de sustitución de la API de recomendaciones.
+
+Implementa el mismo contrato que la API real (`/`, `/recommend`) más el
+endpoint por lotes `/recommend/batch` y el endpoint en streaming
+`/recommend/stream` (NDJSON), sobre un catálogo sintético y determinista.
+`/recommend` negocia Arrow IPC o msgpack columnar (cabecera Accept) y
+gzip/zstd (Accept-Encoding) cuando las librerías están instaladas.
+Sirve para probar el frontend sin la API ni el dataset.
+
+Uso:
+    python mock_api.py --port 8000 --tracks 5000
+    python mock_api.py --item-delay 0.05   # simula un KNN lento (mide el tiempo hasta la 1ª recomendación)
+    python mock_api.py --export-catalog catalog   # catálogo para RECOMMENDER_ENGINE=embedded
+    python mock_api.py --latency 80 --jitter 40 --error-rate 0.02   # red lenta y fallos (benchmark.py)
+    python mock_api.py --no-binary --no-compression   # servidor antiguo: solo JSON sin comprimir
+    streamlit run Stramlit_frontend.py
+"""
+import argparse
+import gzip
+import json
+import math
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# ==========================================
+# CATÁLOGO SINTÉTICO
+# ==========================================
+FEATURES = ['danceability', 'energy', 'valence', 'acousticness', 'speechiness',
+            'instrumentalness', 'liveness', 'tempo']
+
+CLUSTER_TYPES = ['Bailable', 'Energética', 'Acústica', 'Melancólica', 'Hablada']
+
+KNOWN_SONGS = [
+    ("Bohemian Rhapsody", "Queen", 1975),
+    ("Hotel California", "Eagles", 1976),
+    ("Billie Jean", "Michael Jackson", 1982),
+    ("Smells Like Teen Spirit", "Nirvana", 1991),
+    ("Imagine", "John Lennon", 1971),
+    ("Despacito", "Luis Fonsi", 2017),
+    ("Blinding Lights", "The Weeknd", 2019),
+    ("La Bamba", "Ritchie Valens", 1958),
+]
+
+_WORDS = ['Love', 'Night', 'Fire', 'Dream', 'Heart', 'Blue', 'Summer', 'Rain', 'Dance',
+          'Light', 'Shadow', 'Road', 'Sky', 'Gold', 'Wild', 'River', 'Moon', 'City',
+          'Electric', 'Silent', 'Lost', 'Golden', 'Broken', 'Sweet', 'Midnight']
+_ARTIST_WORDS = ['The', 'Black', 'Velvet', 'Neon', 'Crystal', 'Iron', 'Echo', 'Royal',
+                 'Paper', 'Sonic', 'Lunar', 'Arctic', 'Savage', 'Golden', 'Little']
+
+
+def build_catalog(n_tracks, seed=42):
+    """Genera un catálogo determinista de canciones con características de audio"""
+    rng = random.Random(seed)
+    artists = [
+        f"{rng.choice(_ARTIST_WORDS)} {rng.choice(_ARTIST_WORDS)}s"
+        for _ in range(max(1, n_tracks // 8))
+    ]
+    tracks = []
+    for i in range(n_tracks):
+        if i < len(KNOWN_SONGS):
+            name, artist, year = KNOWN_SONGS[i]
+        else:
+            name = " ".join(rng.sample(_WORDS, rng.randint(1, 3)))
+            artist = rng.choice(artists)
+            year = rng.randint(1950, 2023)
+        track = {
+            'id': i,
+            'name': name,
+            'artists': artist,
+            'year': year,
+            'popularity': rng.randint(0, 100),
+        }
+        for feature in FEATURES:
+            track[feature] = round(rng.random(), 4)
+        track['tempo'] = round(60 + track['tempo'] * 140, 2)
+        track['cluster_id'] = max(range(len(CLUSTER_TYPES)),
+                                  key=lambda c: track[FEATURES[c]])
+        track['cluster_type'] = CLUSTER_TYPES[track['cluster_id']]
+        tracks.append(track)
+    return tracks
+
+
+def _vector(track):
+    return [track[f] if f != 'tempo' else (track[f] - 60) / 140 for f in FEATURES]
+
+
+class Recommender:
+    """KNN exacto por fuerza bruta sobre el catálogo sintético"""
+
+    def __init__(self, tracks, k=10):
+        self.tracks = tracks
+        self.k = k
+        self.vectors = [_vector(t) for t in tracks]
+        self.by_name = {}
+        for track in tracks:
+            self.by_name.setdefault(track['name'].casefold(), []).append(track)
+
+    def find(self, song_name, artist_name=""):
+        candidates = self.by_name.get((song_name or "").strip().casefold(), [])
+        artist = (artist_name or "").strip().casefold()
+        if artist:
+            candidates = [t for t in candidates if artist in t['artists'].casefold()]
+        return candidates[0] if candidates else None
+
+    def recommend(self, song_name, artist_name="", k=None):
+        """Devuelve (status, payload) con el mismo formato que la API real"""
+        track = self.find(song_name, artist_name)
+        if track is None:
+            return 404, {"detail": f"No se encontró la canción '{song_name}'"}
+        k = k or self.k
+        origin = self.vectors[track['id']]
+        distances = []
+        for other, vector in zip(self.tracks, self.vectors):
+            if other['id'] == track['id']:
+                continue
+            distances.append((math.dist(origin, vector), other))
+        distances.sort(key=lambda pair: pair[0])
+
+        recommendations = []
+        for distance, other in distances[:k]:
+            score = 1.0 / (1.0 + distance)
+            rec = {f: other[f] for f in ('name', 'artists', 'year', 'popularity',
+                                         'cluster_type', 'cluster_id')}
+            rec.update({f: other[f] for f in FEATURES})
+            rec['similarity_distance'] = round(distance, 6)
+            rec['similarity_score'] = round(score, 6)
+            rec['similarity_percentage'] = round(score * 100.0, 2)
+            rec['cluster_features'] = f"{other['cluster_type']} ({FEATURES[other['cluster_id']]})"
+            recommendations.append(rec)
+
+        return 200, {
+            "song_found": {
+                "name": track['name'],
+                "artist": track['artists'],
+                "year": track['year'],
+            },
+            "recommendations": recommendations,
+        }
+
+
+def export_catalog(tracks, directory):
+    """Escribe el catálogo en el formato del motor integrado (features.npy + tracks.*)"""
+    import os
+
+    import numpy as np
+    import pandas as pd
+
+    os.makedirs(directory, exist_ok=True)
+    features = np.asarray([_vector(t) for t in tracks], dtype=np.float32)
+    np.save(os.path.join(directory, "features.npy"), features)
+
+    metadata = pd.DataFrame(tracks)
+    metadata['cluster_features'] = [
+        f"{t['cluster_type']} ({FEATURES[t['cluster_id']]})" for t in tracks
+    ]
+    try:
+        path = os.path.join(directory, "tracks.parquet")
+        metadata.to_parquet(path, index=False)
+    except ImportError:
+        path = os.path.join(directory, "tracks.csv")
+        metadata.to_csv(path, index=False)
+    return path
+
+
+# ==========================================
+# FORMATOS DE RESPUESTA
+# ==========================================
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+JSON_MEDIA_TYPE = "application/json"
+
+# Por debajo de este tamaño comprimir no compensa
+COMPRESSION_MIN_BYTES = 1024
+
+
+def encode_arrow(payload):
+    """Recomendaciones como tabla Arrow IPC; la canción encontrada va en los metadatos"""
+    table = pa.Table.from_pylist(payload["recommendations"])
+    table = table.replace_schema_metadata({"song_found": json.dumps(payload["song_found"])})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def encode_msgpack(payload):
+    """Recomendaciones en msgpack por columnas ({columna: [valores]})"""
+    recommendations = payload["recommendations"]
+    names = dict.fromkeys(name for rec in recommendations for name in rec)
+    columns = {name: [rec.get(name) for rec in recommendations] for name in names}
+    return msgpack.packb({"song_found": payload["song_found"], "recommendations": columns})
+
+
+ENCODERS = {
+    ARROW_MEDIA_TYPE: ("arrow", encode_arrow),
+    MSGPACK_MEDIA_TYPE: ("msgpack", encode_msgpack),
+}
+
+
+def parse_quality_list(header):
+    """[(valor, calidad)] de una cabecera Accept / Accept-Encoding, de mayor a menor calidad"""
+    items = []
+    for position, part in enumerate((header or "").split(",")):
+        value, *params = [p.strip() for p in part.split(";")]
+        if not value:
+            continue
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            items.append((quality, -position, value.lower()))
+    return [(value, quality) for quality, _, value in sorted(items, reverse=True)]
+
+
+def default_capabilities():
+    """Capacidades que anuncia el servidor según las librerías disponibles"""
+    capabilities = ["batch", "stream"]
+    if pa is not None:
+        capabilities.append("arrow")
+    if msgpack is not None:
+        capabilities.append("msgpack")
+    return tuple(capabilities)
+
+
+# ==========================================
+# SERVIDOR HTTP
+# ==========================================
+class MockAPIHandler(BaseHTTPRequestHandler):
+    """Manejador HTTP/1.1 (keep-alive) con el contrato de la API"""
+
+    protocol_version = "HTTP/1.1"
+    recommender = None
+    capabilities = ("batch", "stream")
+    compression = True
+    # Segundos de "cálculo" por recomendación (simula consultas KNN lentas)
+    item_delay = 0.0
+    # Latencia fija + variable (segundos) y fracción de peticiones que fallan con 503
+    latency = 0.0
+    jitter = 0.0
+    error_rate = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        self._send_body(status, json.dumps(payload).encode("utf-8"), JSON_MEDIA_TYPE)
+
+    def _send_body(self, status, body, content_type):
+        encoding = self._choose_encoding(len(body))
+        if encoding == "zstd":
+            body = zstandard.ZstdCompressor(level=3).compress(body)
+        elif encoding == "gzip":
+            body = gzip.compress(body, compresslevel=5)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Vary", "Accept, Accept-Encoding")
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _choose_encoding(self, size):
+        if not self.compression or size < COMPRESSION_MIN_BYTES:
+            return None
+        for encoding, _ in parse_quality_list(self.headers.get("Accept-Encoding")):
+            if encoding == "zstd" and zstandard is not None:
+                return "zstd"
+            if encoding == "gzip":
+                return "gzip"
+        return None
+
+    def _send_recommendations(self, status, payload):
+        """Respuesta de /recommend en el formato preferido por el cliente"""
+        if status == 200:
+            for media_type, _ in parse_quality_list(self.headers.get("Accept")):
+                capability, encoder = ENCODERS.get(media_type, (None, None))
+                if capability in self.capabilities:
+                    self._send_body(status, encoder(payload), media_type)
+                    return
+        self._send_json(status, payload)
+
+    def _send_chunk(self, payload):
+        line = json.dumps(payload).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(line):X}\r\n".encode("ascii") + line + b"\r\n")
+        self.wfile.flush()
+
+    def _stream_recommendations(self, status, payload):
+        """Envía la canción encontrada y luego cada recomendación como NDJSON"""
+        if status != 200:
+            self._send_json(status, payload)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            self._send_chunk({"type": "song_found", "data": payload["song_found"]})
+            for rec in payload["recommendations"]:
+                time.sleep(self.item_delay)
+                self._send_chunk({"type": "recommendation", "data": rec})
+            self._send_chunk({"type": "end", "count": len(payload["recommendations"])})
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # El cliente dejó de leer (p. ej. una nueva búsqueda)
+            self.close_connection = True
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return None
+
+    def do_GET(self):
+        if self.path == "/":
+            self._send_json(200, {"status": "ok", "capabilities": list(self.capabilities)})
+        else:
+            self._send_json(404, {"detail": "Not Found"})
+
+    def _simulate_network(self):
+        """Aplica la latencia configurada; devuelve False si la petición debe fallar"""
+        delay = self.latency + random.uniform(0.0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        return random.random() >= self.error_rate
+
+    def do_POST(self):
+        body = self._read_json()
+        if not self._simulate_network():
+            self._send_json(503, {"detail": "Servicio no disponible (fallo simulado)"})
+        elif body is None:
+            self._send_json(422, {"detail": "JSON inválido"})
+        elif self.path == "/recommend":
+            status, payload = self.recommender.recommend(
+                body.get("song_name", ""), body.get("artist_name", ""), body.get("k")
+            )
+            if status == 200:
+                time.sleep(self.item_delay * len(payload["recommendations"]))
+            self._send_recommendations(status, payload)
+        elif self.path == "/recommend/stream" and "stream" in self.capabilities:
+            status, payload = self.recommender.recommend(
+                body.get("song_name", ""), body.get("artist_name", ""), body.get("k")
+            )
+            self._stream_recommendations(status, payload)
+        elif self.path == "/recommend/batch" and "batch" in self.capabilities:
+            results = []
+            for seed in body.get("seeds", []):
+                status, payload = self.recommender.recommend(
+                    seed.get("song_name", ""), seed.get("artist_name", ""), body.get("k")
+                )
+                if status == 200:
+                    results.append({"status": status, "data": payload})
+                else:
+                    results.append({"status": status, "detail": payload["detail"]})
+            self._send_json(200, {"results": results})
+        else:
+            self._send_json(404, {"detail": "Not Found"})
+
+
+def make_server(host="127.0.0.1", port=8000, tracks=5000, k=10,
+                capabilities=None, item_delay=0.0,
+                latency=0.0, jitter=0.0, error_rate=0.0, compression=True):
+    """Crea (sin arrancar) un servidor de sustitución; port=0 elige un puerto libre"""
+    handler = type("Handler", (MockAPIHandler,), {
+        "recommender": Recommender(build_catalog(tracks), k=k),
+        "capabilities": default_capabilities() if capabilities is None else tuple(capabilities),
+        "compression": compression,
+        "item_delay": item_delay,
+        "latency": latency,
+        "jitter": jitter,
+        "error_rate": error_rate,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API de recomendaciones de sustitución")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--tracks", type=int, default=5000, help="Tamaño del catálogo sintético")
+    parser.add_argument("--k", type=int, default=10, help="Recomendaciones por defecto")
+    parser.add_argument("--no-batch", action="store_true", help="No anunciar ni servir /recommend/batch")
+    parser.add_argument("--no-stream", action="store_true", help="No anunciar ni servir /recommend/stream")
+    parser.add_argument("--no-binary", action="store_true",
+                        help="Responder solo JSON (sin Arrow ni msgpack) como una API antigua")
+    parser.add_argument("--no-compression", action="store_true", help="No comprimir las respuestas")
+    parser.add_argument("--item-delay", type=float, default=0.0,
+                        help="Segundos de cálculo simulado por recomendación")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Milisegundos de latencia fija por petición POST")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="Milisegundos de latencia aleatoria adicional (0..jitter)")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Fracción de peticiones POST que responden 503")
+    parser.add_argument("--export-catalog", metavar="DIR",
+                        help="Exporta el catálogo para el motor integrado y termina")
+    args = parser.parse_args()
+
+    if args.export_catalog:
+        path = export_catalog(build_catalog(args.tracks), args.export_catalog)
+        print(f"📦 Catálogo de {args.tracks} canciones exportado en {path}")
+        return
+
+    disabled = {"batch": args.no_batch, "stream": args.no_stream,
+                "arrow": args.no_binary, "msgpack": args.no_binary}
+    capabilities = tuple(name for name in default_capabilities() if not disabled[name])
+    server = make_server(args.host, args.port, args.tracks, args.k, capabilities, args.item_delay,
+                         args.latency / 1000.0, args.jitter / 1000.0, args.error_rate,
+                         compression=not args.no_compression)
+    print(f"🎵 API de sustitución escuchando en http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
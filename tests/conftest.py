@@ -0,0 +1,43 @@
+import os
+import sys
+import threading
+
+import pytest
+
+# Los módulos del proyecto están en la raíz del repositorio (no es un paquete)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mock_api  # noqa: E402
+
+
+@pytest.fixture
+def api_server():
+    """Arranca APIs de sustitución (mock_api) en puertos libres; devuelve su URL"""
+    servers = []
+
+    def start(**options):
+        options.setdefault("tracks", 200)
+        server = mock_api.make_server(port=0, **options)
+        threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def make_client():
+    """Cliente de la API con su propia caché contra las réplicas indicadas"""
+    import requests
+
+    import Stramlit_frontend as app
+
+    def make(*urls, cache=None):
+        cache = cache if cache is not None else app.ResponseCache(1000, 64 * 1024 * 1024, 3600, 120)
+        pool = app.ReplicaPool([app.Replica(url) for url in urls])
+        return app.RecommendationClient(requests.Session(), cache, pool)
+
+    return make
@@ -0,0 +1,102 @@
+import argparse
+import json
+import os
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+import Stramlit_frontend as app
+import batch_recommend
+
+
+@pytest.fixture
+def job(tmp_path, api_server, make_client, monkeypatch):
+    """Semillas en CSV, directorio de salida y llamadas contadas contra mock_api"""
+    client = make_client(api_server())
+    monkeypatch.setattr(app, "ENGINE_MODE", "api")
+    monkeypatch.setattr(app, "get_api_client", lambda: client)
+    calls = []
+    real = app.get_recommendations
+    monkeypatch.setattr(app, "get_recommendations", lambda song, artist="": calls.append(song) or real(song, artist))
+
+    seeds = tmp_path / "seeds.csv"
+    seeds.write_text(
+        "song_name,artist_name\n"
+        "Bohemian Rhapsody,Queen\n"
+        "Hotel California,\n"
+        "No existe,\n"
+        "Billie Jean,Michael Jackson\n"
+        "Hotel California,Eagles\n",
+        encoding="utf-8",
+    )
+    args = argparse.Namespace(seeds=str(seeds), output=str(tmp_path / "out"), chunk_size=2,
+                              concurrency=2, rate=0.0, attempts=1, restart=False)
+    return args, calls
+
+
+def test_output_matches_the_schema(job):
+    args, _ = job
+    assert batch_recommend.run(app, args) == 0
+    assert sorted(os.listdir(args.output)) == ["_checkpoint.json", "part-00000.parquet",
+                                               "part-00001.parquet", "part-00002.parquet"]
+    for name in ("part-00000.parquet", "part-00002.parquet"):
+        assert pq.read_schema(os.path.join(args.output, name)).equals(batch_recommend.OUTPUT_SCHEMA)
+
+    frame = pd.read_parquet(args.output)
+    assert sorted(frame["seed_index"].unique()) == [0, 1, 2, 3, 4]
+    missing = frame[frame["seed_index"] == 2]
+    assert len(missing) == 1 and "No se encontró" in missing["error"].iloc[0]
+    found = frame[frame["seed_index"] == 0]
+    assert found["rank"].tolist() == list(range(1, len(found) + 1))
+    assert (found["found_name"] == "Bohemian Rhapsody").all() and found["error"].isna().all()
+
+
+def test_resume_fetches_only_missing_chunks(job):
+    args, calls = job
+    batch_recommend.run(app, args)
+    # Como si el trabajo se hubiera cortado antes de terminar el bloque 1
+    path = os.path.join(args.output, "_checkpoint.json")
+    with open(path, encoding="utf-8") as f:
+        state = json.load(f)
+    del state["completed"]["1"]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.remove(os.path.join(args.output, "part-00001.parquet"))
+
+    calls.clear()
+    assert batch_recommend.run(app, args) == 0
+    assert sorted(calls) == ["Billie Jean", "No existe"]
+    assert sorted(pd.read_parquet(args.output)["seed_index"].unique()) == [0, 1, 2, 3, 4]
+
+
+def test_checkpoint_of_another_job_is_rejected(job):
+    args, _ = job
+    batch_recommend.run(app, args)
+    args.chunk_size = 3
+    with pytest.raises(ValueError, match="--restart"):
+        batch_recommend.run(app, args)
+
+
+def test_restart_only_removes_the_jobs_own_files(job):
+    args, calls = job
+    batch_recommend.run(app, args)
+    open(os.path.join(args.output, ".part-00007.parquet.tmp"), "w").close()
+    args.restart = True
+    args.chunk_size = 3
+    calls.clear()
+    assert batch_recommend.run(app, args) == 0
+    assert len(calls) == 5
+    assert sorted(os.listdir(args.output)) == ["_checkpoint.json", "part-00000.parquet", "part-00001.parquet"]
+
+
+def test_restart_refuses_a_directory_with_other_files(job):
+    args, _ = job
+    os.makedirs(args.output)
+    notes = os.path.join(args.output, "notas.txt")
+    open(notes, "w").close()
+    open(os.path.join(args.output, "part-00000.parquet"), "w").close()
+    args.restart = True
+    with pytest.raises(ValueError, match="notas.txt"):
+        batch_recommend.run(app, args)
+    assert sorted(os.listdir(args.output)) == ["notas.txt", "part-00000.parquet"]
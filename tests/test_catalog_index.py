@@ -0,0 +1,73 @@
+import pytest
+
+import Stramlit_frontend as app
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    path = tmp_path / "tracks.csv"
+    path.write_text(
+        "name,artists,popularity\n"
+        "Bohemian Rhapsody,Queen,90\n"
+        "Bohemian Like You,The Dandy Warhols,60\n"
+        "Canción del Mariachi,Los Lobos,50\n"
+        "Hey  Jude,The Beatles,80\n"
+        "Heroes,David Bowie,85\n",
+        encoding="utf-8",
+    )
+    return path
+
+
+def test_exact_match_ignores_case_accents_and_spaces(snapshot):
+    index = app.CatalogIndex(str(snapshot))
+    assert index.exact("bohemian rhapsody") == ("Bohemian Rhapsody", "Queen")
+    # Devuelve la entrada tal como está en el catálogo, que es lo que espera la API
+    assert index.exact("CANCION DEL MARIACHI", "lobos") == ("Canción del Mariachi", "Los Lobos")
+    assert index.exact("hey jude", "beatles") == ("Hey  Jude", "The Beatles")
+    assert index.exact("bohemian rhapsody", "beatles") is None
+    assert index.exact("bohemian") is None
+
+
+def test_suggest_songs_sends_the_canonical_entry(snapshot, monkeypatch):
+    index = app.CatalogIndex(str(snapshot))
+    monkeypatch.setattr(app, "get_catalog_index", lambda: index)
+    assert app.suggest_songs("cancion del mariachi") == (("Canción del Mariachi", "Los Lobos"), [])
+    match, suggestions = app.suggest_songs("bohemain rapsody")
+    assert match is None and suggestions[0] == ("Bohemian Rhapsody", "Queen")
+
+
+def test_suggest_ranks_typos_and_prefixes(snapshot):
+    index = app.CatalogIndex(str(snapshot))
+    assert index.suggest("bohemain rapsody")[0] == ("Bohemian Rhapsody", "Queen")
+    assert index.suggest("bohem", limit=2) == [("Bohemian Rhapsody", "Queen"),
+                                               ("Bohemian Like You", "The Dandy Warhols")]
+    # El artista desempata entre nombres parecidos
+    assert index.suggest("bohemian", "warhols")[0] == ("Bohemian Like You", "The Dandy Warhols")
+    assert index.suggest("") == []
+
+
+def test_suggest_bounds_work_on_common_trigrams(snapshot):
+    index = app.CatalogIndex(str(snapshot))
+    index.max_df = 0.0  # todos los trigramas cuentan como demasiado frecuentes
+    index.max_scanned = 1
+    index.max_scored = 1
+    # La lista más rara se usa siempre, así que sigue habiendo sugerencias
+    assert len(index.suggest("heroes")) >= 1
+
+
+def test_refresh_indexes_new_rows_and_hides_removed_ones(snapshot):
+    index = app.CatalogIndex(str(snapshot), refresh_interval=0)
+    snapshot.write_text(
+        "name,artists,popularity\n"
+        "Bohemian Rhapsody,Queen,90\n"
+        "Africa,Toto,70\n",
+        encoding="utf-8",
+    )
+    index._mtime = None  # el mtime puede no cambiar dentro del mismo segundo
+    index.refresh(force=True)
+    assert len(index) == 2
+    assert index.exact("africa", "toto") == ("Africa", "Toto")
+    assert index.exact("heroes") is None
+    assert ("Heroes", "David Bowie") not in index.suggest("heroes")
+    names = [name for name, _ in index.sorted_names]
+    assert names == sorted(names)
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import Stramlit_frontend as app
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    # Puntos en una recta: los vecinos de cada canción se conocen de antemano
+    features = np.array([[0.0, 0.0], [1.0, 0.0], [3.0, 0.0], [6.0, 0.0], [10.0, 0.0]])
+    np.save(tmp_path / "features.npy", features)
+    pd.DataFrame({
+        "id": range(5),
+        "name": ["Hey  Jude", "Let It Be", "Yesterday", "Help", "Yesterday"],
+        "artists": ["The Beatles", "The Beatles", "The Beatles", "The Beatles", "Boyz II Men"],
+        "year": [1968, 1970, 1965, 1965, 1994],
+        "energy": [0.1, 0.2, 0.3, 0.4, 0.5],
+    }).to_csv(tmp_path / "tracks.csv", index=False)
+    return tmp_path
+
+
+def test_neighbours_are_sorted_and_exclude_the_seed(catalog):
+    engine = app.EmbeddedKNNEngine(str(catalog), k=3)
+    indices, distances = engine.neighbours(1, 3)
+    assert indices.tolist() == [0, 2, 3]
+    assert np.allclose(distances, [1.0, 2.0, 5.0])
+    # k mayor que el catálogo: todas las demás canciones
+    assert len(engine.neighbours(0, 50)[0]) == 4
+
+
+def test_recommend_payload_matches_the_api_shape(catalog):
+    engine = app.EmbeddedKNNEngine(str(catalog), k=2)
+    data, error = engine.recommend("let it be")
+    assert error is None
+    assert data["song_found"] == {"name": "Let It Be", "artist": "The Beatles", "year": 1970}
+    first = data["recommendations"][0]
+    assert first["name"] == "Hey  Jude"
+    assert "id" not in first
+    assert first["energy"] == 0.1
+    assert (first["similarity_distance"], first["similarity_score"], first["similarity_percentage"]) == (1.0, 0.5, 50.0)
+    assert [rec["name"] for rec in data["recommendations"]] == ["Hey  Jude", "Yesterday"]
+
+
+def test_find_normalizes_like_the_seed_and_filters_by_artist(catalog):
+    engine = app.EmbeddedKNNEngine(str(catalog))
+    assert engine.find("hey jude") == 0
+    assert engine.find("  HEY   JUDE ", "beatles") == 0
+    assert engine.find("yesterday", "boyz") == 4
+    assert engine.find("yesterday", "queen") is None
+
+    data, error = engine.recommend("no existe")
+    assert data is None and "No se encontró" in error
+
+
+def test_batch_is_keyed_by_normalized_seed(catalog):
+    engine = app.EmbeddedKNNEngine(str(catalog), k=1)
+    results = engine.recommend_batch([("Help", ""), ("nada", "")])
+    assert results[app.normalize_seed("help")][0]["recommendations"][0]["name"] == "Yesterday"
+    assert results[app.normalize_seed("nada")][0] is None
+
+
+def test_inconsistent_catalog_is_rejected(catalog):
+    np.save(catalog / "features.npy", np.zeros((3, 2)))
+    with pytest.raises(ValueError):
+        app.EmbeddedKNNEngine(str(catalog))
+
+
+def test_loader_remembers_a_missing_catalog(tmp_path, monkeypatch):
+    loader = app.EmbeddedEngineLoader(str(tmp_path / "missing"), retry_interval=30)
+    calls = []
+    real = app.EmbeddedKNNEngine
+    monkeypatch.setattr(app, "EmbeddedKNNEngine", lambda d: calls.append(d) or real(d))
+    for _ in range(3):
+        with pytest.raises(FileNotFoundError):
+            loader.get()
+    assert len(calls) == 1
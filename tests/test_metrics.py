@@ -0,0 +1,74 @@
+import os
+import threading
+
+import Stramlit_frontend as app
+
+
+def test_counters_and_gauges_are_typed():
+    metrics = app.MetricsRegistry()
+    labels = (("endpoint", "/recommend"), ("status", "200"))
+    metrics.inc("recommender_http_requests_total", labels, help_text="Peticiones HTTP a la API")
+    metrics.inc("recommender_http_requests_total", labels)
+    text = metrics.to_prometheus({"recommender_cache_hits_total": 7, "recommender_cache_entries": 3})
+    lines = text.splitlines()
+    assert lines[:3] == [
+        "# HELP recommender_http_requests_total Peticiones HTTP a la API",
+        "# TYPE recommender_http_requests_total counter",
+        'recommender_http_requests_total{endpoint="/recommend",status="200"} 2',
+    ]
+    assert "# TYPE recommender_cache_entries gauge" in lines
+    assert "# TYPE recommender_cache_hits_total counter" in lines
+    assert "recommender_cache_hits_total 7" in lines
+    assert text.endswith("\n")
+
+
+def test_histogram_buckets_are_cumulative():
+    metrics = app.MetricsRegistry()
+    for value in (0.01, 0.2, 0.2, 30.0):
+        metrics.observe("recommender_phase_seconds", value, (("phase", "fetch"),))
+    lines = metrics.to_prometheus().splitlines()
+    assert "# TYPE recommender_phase_seconds histogram" in lines
+    buckets = [line for line in lines if line.startswith("recommender_phase_seconds_bucket")]
+    assert len(buckets) == len(app.LATENCY_BUCKETS) + 1
+    # El límite es inclusivo (le): 0.01 cuenta en su propio cubo
+    assert 'recommender_phase_seconds_bucket{phase="fetch",le="0.01"} 1' in buckets
+    assert 'recommender_phase_seconds_bucket{phase="fetch",le="0.25"} 3' in buckets
+    assert buckets[-1] == 'recommender_phase_seconds_bucket{phase="fetch",le="+Inf"} 4'
+    assert 'recommender_phase_seconds_count{phase="fetch"} 4' in lines
+    total = float(next(l for l in lines if l.startswith("recommender_phase_seconds_sum")).split()[-1])
+    assert abs(total - 30.41) < 1e-9
+
+
+def test_label_values_are_escaped():
+    metrics = app.MetricsRegistry()
+    metrics.inc("recommender_errors_total", (("error", 'dijo "no"\\\nadiós'),))
+    line = metrics.to_prometheus().splitlines()[-1]
+    assert line == 'recommender_errors_total{error="dijo \\"no\\"\\\\\\nadiós"} 1'
+
+
+def test_export_replaces_the_file_atomically(tmp_path, monkeypatch):
+    path = tmp_path / "metrics.prom"
+    monkeypatch.setattr(app, "METRICS_PROM_PATH", str(path))
+    monkeypatch.setattr(app, "METRICS_PROM_INTERVAL", 0)
+    monkeypatch.setattr(app, "METRICS_JSONL_PATH", "")
+    metrics = app.MetricsRegistry()
+    metrics.inc("recommender_http_requests_total")
+
+    threads = [threading.Thread(target=metrics.export, args=(None, {"recommender_cache_entries": i}))
+               for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert os.listdir(tmp_path) == ["metrics.prom"]
+    assert path.read_text(encoding="utf-8").endswith("\n")
+    assert "recommender_http_requests_total 1" in path.read_text(encoding="utf-8")
+    assert os.stat(path).st_mode & 0o777 == 0o644
+
+
+def test_export_failures_do_not_raise(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "METRICS_PROM_PATH", str(tmp_path / "missing" / "metrics.prom"))
+    monkeypatch.setattr(app, "METRICS_PROM_INTERVAL", 0)
+    monkeypatch.setattr(app, "METRICS_JSONL_PATH", "")
+    app.MetricsRegistry().export(None)
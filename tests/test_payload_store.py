@@ -0,0 +1,112 @@
+import gc
+
+import pytest
+
+import Stramlit_frontend as app
+
+
+def payload(name, k=20):
+    return {
+        "song_found": {"name": name, "artist": "x", "year": 2000},
+        "recommendations": [
+            {"name": f"{name} {i}", "artists": "x", "year": 2000, "similarity_percentage": 50.0}
+            for i in range(k)
+        ],
+    }
+
+
+@pytest.fixture
+def store():
+    return app.PayloadStore()
+
+
+def test_store_shares_one_copy_and_counts_references(store):
+    key = app.normalize_seed("a")
+    first = store.acquire(key, payload("a"))
+    second = store.acquire(key, payload("a"))
+    assert first is second
+    assert store.stats()["references"] == 2
+    store.release(key)
+    assert store.get(key) is first
+    store.release(key)
+    assert store.get(key) is None
+    assert store.stats() == {"entries": 0, "references": 0, "bytes": 0}
+
+
+def test_graph_releases_references_when_collected(store):
+    graph = app.ExplorationGraph("a", "", payload("a"), store=store)
+    child = graph.select(0, "b")
+    graph.attach(child, payload("b"))
+    assert store.stats()["entries"] == 2
+    del graph, child
+    gc.collect()
+    assert store.stats()["entries"] == 0
+
+
+def test_eviction_keeps_the_path_and_drops_old_branches(store):
+    graph = app.ExplorationGraph("a", "", payload("a"), max_nodes=3, store=store)
+    for seed in ("b", "c", "d"):
+        graph.attach(graph.select(0, seed), payload(seed))
+    # La rama visible es a → d; b (la más antigua fuera de ella) se olvida
+    assert set(graph.nodes) == {app.normalize_seed(s) for s in ("a", "c", "d")}
+    assert store.get(app.normalize_seed("b")) is None
+
+
+def test_path_depth_is_capped_by_max_nodes(store):
+    graph = app.ExplorationGraph("s0", "", payload("s0"), max_nodes=3, store=store)
+    depth = 0
+    while True:
+        child = graph.select(depth, f"s{depth + 1}")
+        if child is None:
+            break
+        graph.attach(child, payload(f"s{depth + 1}"))
+        depth += 1
+    assert len(graph.path) == 3
+    assert len(graph.nodes) == 3
+
+
+def test_reselecting_an_ancestor_jumps_back_to_it(store):
+    graph = app.ExplorationGraph("a", "", payload("a"), store=store)
+    graph.attach(graph.select(0, "b"), payload("b"))
+    node = graph.select(1, " A ")
+    assert node is graph.root
+    assert graph.path == [app.normalize_seed("a")]
+
+
+def test_byte_budget_is_enforced_on_the_path(store):
+    one = app.payload_nbytes(app.compact_payload(payload("z")))
+    graph = app.ExplorationGraph("s0", "", payload("s0"), max_bytes=int(one * 2.5), store=store)
+    assert graph.attach(graph.select(0, "s1"), payload("s1")) is not None
+    refused = graph.select(1, "s2")
+    assert graph.attach(refused, payload("s2")) is None
+    assert refused.data is None
+    assert graph.nbytes <= graph.max_bytes
+    assert store.get(refused.key) is None
+
+
+def test_compact_frame_shares_read_only_buffers():
+    records = app.CompactRecords.from_records(payload("a")["recommendations"])
+    frame = records.to_frame()
+    column = frame["similarity_percentage"].to_numpy()
+    assert not column.flags.writeable
+    assert frame["year"].tolist() == [2000] * 20
+
+
+def test_compact_records_from_arrow_columns_skip_python_lists(monkeypatch):
+    pa = pytest.importorskip("pyarrow")
+    import pandas as pd
+
+    records = payload("a", k=5)["recommendations"]
+    records[1]["artists"] = None
+    records[2]["similarity_percentage"] = None
+    frame = pa.Table.from_pylist(records).to_pandas(split_blocks=True)
+    # Las columnas se leen de sus buffers, nunca con tolist()
+    monkeypatch.setattr(pd.Series, "tolist", lambda self: pytest.fail("tolist()"))
+    compact = app.CompactRecords.from_records(app.RecordsView(frame))
+
+    assert compact.columns["year"].typecode == "q"
+    assert compact.columns["similarity_percentage"].typecode == "d"
+    assert compact.columns["name"][3] is app.sys.intern("a 3")
+    assert compact[1]["artists"] is None
+    assert compact[0] == {"name": "a 0", "artists": "x", "year": 2000, "similarity_percentage": 50.0}
+    assert compact.nbytes == app.CompactRecords.from_records(frame.to_dict("records")).nbytes
@@ -0,0 +1,208 @@
+import threading
+import time
+
+import pytest
+
+import Stramlit_frontend as app
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(app.time, "monotonic", clock)
+    return clock
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    replica = app.Replica("http://a", failure_threshold=2, cooldown=30)
+    for expected_open in (False, True):
+        lease = replica.try_acquire()
+        assert lease == "normal"
+        assert replica.release(ok=False, trial=False) is expected_open
+    assert replica.breaker == "open"
+    assert replica.try_acquire() is None
+
+
+def test_success_resets_the_failure_count(clock):
+    replica = app.Replica("http://a", failure_threshold=2, cooldown=30)
+    replica.try_acquire()
+    replica.release(ok=False)
+    replica.try_acquire()
+    replica.release(ok=True)
+    replica.try_acquire()
+    assert replica.release(ok=False) is False
+    assert replica.breaker == "closed"
+
+
+def test_half_open_lets_a_single_trial_through(clock):
+    replica = app.Replica("http://a", failure_threshold=1, cooldown=30)
+    replica.try_acquire()
+    replica.release(ok=False)
+    clock.now += 30
+    assert replica.breaker == "half_open"
+
+    leases = []
+    barrier = threading.Barrier(8)
+
+    def grab():
+        barrier.wait()
+        leases.append(replica.try_acquire())
+
+    threads = [threading.Thread(target=grab) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert leases.count("trial") == 1
+    assert leases.count(None) == 7
+
+
+def test_trial_outcome_closes_or_reopens_the_breaker(clock):
+    replica = app.Replica("http://a", failure_threshold=1, cooldown=30)
+    replica.try_acquire()
+    replica.release(ok=False)
+
+    clock.now += 30
+    assert replica.try_acquire() == "trial"
+    assert replica.release(ok=False, trial=True) is True
+    assert replica.breaker == "open"
+
+    clock.now += 30
+    assert replica.try_acquire() == "trial"
+    replica.release(ok=True, trial=True)
+    assert replica.breaker == "closed"
+    assert replica.try_acquire() == "normal"
+
+
+def test_late_normal_request_does_not_free_the_trial_slot(clock):
+    replica = app.Replica("http://a", failure_threshold=1, cooldown=30)
+    assert replica.try_acquire() == "normal"  # petición lenta, sigue en curso
+    replica.try_acquire()
+    replica.release(ok=False)
+    clock.now += 30
+    assert replica.try_acquire() == "trial"
+    replica.release(ok=False, trial=False)  # la lenta falla y reabre el disyuntor
+    clock.now += 30
+    # La prueba sigue en curso: no se lanza una segunda
+    assert replica.try_acquire() is None
+    replica.release(ok=True, trial=True)
+    assert replica.try_acquire() == "normal"
+
+
+def test_pool_skips_unavailable_replicas(clock):
+    down = app.Replica("http://down", failure_threshold=1, cooldown=30)
+    down.try_acquire()
+    down.release(ok=False)
+    up = app.Replica("http://up")
+    pool = app.ReplicaPool([down, up])
+    for _ in range(5):
+        replica, lease = pool.choose()
+        assert (replica, lease) == (up, "normal")
+        replica.release(ok=True)
+    with pytest.raises(app.NoReplicaAvailable):
+        pool.choose(exclude=[up])
+
+
+class FakeProbe:
+    def __init__(self, state):
+        self.state = state
+
+
+def test_probe_state_ranks_but_never_excludes(clock):
+    sick = app.Replica("http://sick", probe=FakeProbe("error"))
+    well = app.Replica("http://well", probe=FakeProbe("ok"))
+    pool = app.ReplicaPool([sick, well])
+    for _ in range(5):
+        replica, _ = pool.choose()
+        assert replica is well
+        replica.release(ok=True)
+    # Sin ninguna réplica sana se prueba igualmente
+    replica, lease = pool.choose(exclude=[well])
+    assert (replica, lease) == (sick, "normal")
+    well.probe.state = "down"
+    assert pool.choose(exclude=[sick])[0] is well
+
+
+def test_failing_health_endpoint_does_not_block_requests(api_server):
+    import requests
+
+    url = api_server()
+    # La sonda consulta una ruta que da 404, pero /recommend funciona
+    probe = app.HealthProbe(f"{url}/health", interval=3600, timeout=1)
+    try:
+        probe.probe()
+        assert probe.state == "error"
+        pool = app.ReplicaPool([app.Replica(url, probe=probe)])
+        client = app.RecommendationClient(requests.Session(), app.ResponseCache(10, 1 << 20, 60, 60), pool)
+        data, error = client.recommend("Bohemian Rhapsody")
+        assert error is None and data["recommendations"]
+    finally:
+        probe.stop()
+
+
+@pytest.fixture
+def hedging(api_server, monkeypatch):
+    """Cliente con una réplica lenta (la preferida) y una rápida de respaldo"""
+    import requests
+
+    monkeypatch.setattr(app, "HEDGE_ENABLED", True)
+    monkeypatch.setattr(app, "HEDGE_INITIAL_DELAY", 0.05)
+    slow = app.Replica(api_server(latency=0.4))
+    # La sonda solo ordena: la rápida queda como segunda opción
+    fast = app.Replica(api_server(), probe=FakeProbe("down"))
+    metrics = app.MetricsRegistry()
+    client = app.RecommendationClient(
+        requests.Session(), app.ResponseCache(100, 1 << 24, 60, 60), app.ReplicaPool([slow, fast]), metrics
+    )
+    return client, metrics
+
+
+def test_slow_request_is_hedged_within_budget(hedging):
+    client, metrics = hedging
+    client.hedge_budget.balance = 1.0
+    started = time.perf_counter()
+    data, error = client.recommend("Bohemian Rhapsody")
+    assert error is None and data["recommendations"]
+    assert time.perf_counter() - started < 0.3
+    assert metrics.counters[("recommender_hedged_requests_total", (("endpoint", "/recommend"),))] == 1
+
+
+def test_no_hedge_without_budget_or_free_threads(hedging):
+    client, metrics = hedging
+    assert client.recommend("Bohemian Rhapsody")[1] is None
+    client._hedge_slots = 0
+    assert client.recommend("Hotel California")[1] is None
+    assert not any(name == "recommender_hedged_requests_total" for name, _ in metrics.counters)
+    reasons = {dict(labels)["reason"] for name, labels in metrics.counters
+               if name == "recommender_hedge_skipped_total"}
+    assert reasons == {"budget", "saturated"}
+    assert client._hedge_in_flight == 0
+
+
+def test_batch_requests_are_never_hedged(hedging):
+    client, metrics = hedging
+    client.hedge_budget.balance = 5.0
+    results = client.recommend_batch([("Bohemian Rhapsody", ""), ("Hotel California", "")])
+    assert all(error is None for _, error in results.values())
+    assert not any(name == "recommender_hedged_requests_total" for name, _ in metrics.counters)
+    assert client.hedge_budget.balance == 5.0
+
+
+def test_hedge_budget_allows_a_fraction_of_requests():
+    budget = app.HedgeBudget(ratio=0.1, burst=2)
+    granted = 0
+    for _ in range(100):
+        budget.deposit()
+        granted += budget.withdraw()
+    assert granted == 10
+    for _ in range(100):
+        budget.deposit()
+    assert budget.balance == 2
@@ -0,0 +1,75 @@
+import pytest
+
+import mock_api
+import Stramlit_frontend as app
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(app.time, "monotonic", clock)
+    return clock
+
+
+def test_entries_expire_after_their_ttl(clock):
+    cache = app.ResponseCache(max_entries=10, max_bytes=1000, ttl=60, negative_ttl=5)
+    cache.put("a", {"x": 1}, size=10)
+    cache.put("b", None, "❌ no existe", size=10)
+    assert cache.get("a") == ({"x": 1}, None)
+    assert cache.get("b") == (None, "❌ no existe")
+
+    clock.now += 10
+    # Las negativas caducan antes
+    assert cache.get("b") is None
+    assert cache.contains("a")
+    clock.now += 60
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 0
+    assert cache.stats()["negative_hits"] == 1
+
+
+def test_lru_eviction_by_entries_and_bytes(clock):
+    cache = app.ResponseCache(max_entries=2, max_bytes=100, ttl=60, negative_ttl=60)
+    cache.put("a", 1, size=10)
+    cache.put("b", 2, size=10)
+    cache.get("a")  # "b" pasa a ser la menos usada
+    cache.put("c", 3, size=10)
+    assert cache.get("b") is None
+    assert cache.get("a") == (1, None)
+
+    cache.put("big", 4, size=95)
+    assert cache.stats()["bytes"] <= 100
+    assert cache.get("big") == (4, None)
+    # Lo que no cabe entero ni se guarda ni vacía la caché
+    cache.put("huge", 5, size=101)
+    assert cache.get("huge") is None
+    assert cache.get("big") == (4, None)
+
+
+def test_zero_ttl_disables_negative_caching(clock):
+    cache = app.ResponseCache(max_entries=10, max_bytes=1000, ttl=60, negative_ttl=0)
+    cache.put("a", None, "❌", size=1)
+    assert not cache.contains("a")
+
+
+def test_client_answers_repeated_lookups_from_the_cache(api_server, make_client):
+    client = make_client(api_server())
+    track = mock_api.build_catalog(200)[0]
+    data, error = client.recommend(track['name'], track['artists'])
+    assert error is None and data['recommendations']
+    # Misma semilla con otra forma de escribirla: acierto, sin otra petición
+    assert client.recommend(f"  {track['name'].upper()} ", track['artists'])[0] is data
+
+    missing, error = client.recommend("no existe en el catálogo")
+    assert missing is None and "No se encontró" in error
+    assert client.recommend("no existe en el catálogo") == (None, error)
+    stats = client.cache.stats()
+    assert (stats["hits"], stats["negative_hits"], stats["entries"]) == (2, 1, 2)
@@ -0,0 +1,151 @@
+import json
+
+import Stramlit_frontend as app
+
+
+def test_sse_ignores_comments_and_non_data_fields():
+    lines = [
+        b": keep-alive",
+        b"",
+        b"retry: 1000",
+        b"id: 7",
+        b"event: recommendation",
+        b'data: {"type": "song_found"}',
+        b"",
+    ]
+    assert list(app.iter_sse(lines)) == ['{"type": "song_found"}']
+
+
+def test_sse_joins_multiline_data_and_dispatches_on_blank_line():
+    lines = [b'data: {"type":', b'data:"end"}', b"", b"data: a", b"", b"", b"data: tail"]
+    events = list(app.iter_sse(lines))
+    # El último evento no llega a cerrarse con una línea en blanco: se descarta
+    assert events == ['{"type":\n"end"}', "a"]
+    assert json.loads(events[0]) == {"type": "end"}
+
+
+def test_sse_strips_only_one_leading_space():
+    assert list(app.iter_sse(["data:  x", ""])) == [" x"]
+
+
+def test_ndjson_skips_blank_lines():
+    assert list(app.iter_ndjson([b'{"a": 1}', b"  ", b'{"b": 2}'])) == [b'{"a": 1}', b'{"b": 2}']
+
+
+def test_parser_is_chosen_by_content_type():
+    assert app.stream_parser("text/event-stream; charset=utf-8") is app.iter_sse
+    assert app.stream_parser("application/x-ndjson") is app.iter_ndjson
+    assert app.stream_parser("application/json") is None
+    assert app.stream_parser(None) is None
+
+
+# --- Cliente contra un servidor que envía un cuerpo fijo ---
+import threading  # noqa: E402
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # noqa: E402
+
+import pytest  # noqa: E402
+
+import mock_api  # noqa: E402
+
+SONG = {"name": "Song", "artist": "Artist", "year": 2000}
+REC = {"name": "Other", "artists": "Someone", "similarity_percentage": 90.0}
+
+
+def event(kind, data=None, **extra):
+    return json.dumps({"type": kind, "data": data, **extra})
+
+
+@pytest.fixture
+def stream_server():
+    """Servidor que responde a /recommend/stream con (content_type, cuerpo) y cierra"""
+    response = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.0"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            self.send_response(200)
+            self.send_header("Content-Type", response["content_type"])
+            self.end_headers()
+            self.wfile.write(response["body"].encode("utf-8"))
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+
+    def serve(content_type, *lines):
+        response.update(content_type=content_type, body="".join(lines))
+        return f"http://127.0.0.1:{server.server_port}"
+
+    yield serve
+    server.shutdown()
+    server.server_close()
+
+
+def kinds(events):
+    return [kind for kind, _ in events]
+
+
+def test_sse_stream_with_keep_alives_completes(stream_server, make_client):
+    url = stream_server(
+        "text/event-stream",
+        ": ping\n\n",
+        f"event: song\nid: 1\ndata: {event('song_found', SONG)}\n\n",
+        f"retry: 500\ndata: {event('recommendation', REC)}\n\n",
+        f"data: {event('end', count=1)}\n\n",
+    )
+    client = make_client(url)
+    events = list(client.recommend_stream("song"))
+    assert kinds(events) == ["song_found", "recommendation", "done"]
+    assert client.cache.contains(app.normalize_seed("song"))
+
+
+def test_clean_close_before_end_is_partial_and_not_cached(stream_server, make_client):
+    url = stream_server(
+        "application/x-ndjson",
+        event("song_found", SONG) + "\n",
+        event("recommendation", REC) + "\n",
+    )
+    client = make_client(url)
+    events = list(client.recommend_stream("song"))
+    assert kinds(events) == ["song_found", "recommendation", "partial", "error"]
+    assert len(events[2][1]["recommendations"]) == 1
+    assert "incompleta" in events[3][1]
+    assert not client.cache.contains(app.normalize_seed("song"))
+
+
+def test_end_count_must_match_the_rows_received(stream_server, make_client):
+    url = stream_server(
+        "application/x-ndjson",
+        event("song_found", SONG) + "\n",
+        event("recommendation", REC) + "\n",
+        event("end", count=3) + "\n",
+    )
+    client = make_client(url)
+    events = list(client.recommend_stream("song"))
+    assert kinds(events)[-2:] == ["partial", "error"]
+    assert "1 de 3" in events[-1][1]
+    assert not client.cache.contains(app.normalize_seed("song"))
+
+
+def test_stream_without_song_found_is_an_error(stream_server, make_client):
+    url = stream_server(
+        "application/x-ndjson",
+        event("recommendation", REC) + "\n",
+        event("end", count=1) + "\n",
+    )
+    events = list(make_client(url).recommend_stream("song"))
+    # Sin canción no hay nada que mostrar: ni "done" ni "partial"
+    assert kinds(events) == ["recommendation", "error"]
+
+
+def test_mock_api_stream_is_cached_and_replayed(api_server, make_client):
+    client = make_client(api_server(k=5))
+    track = mock_api.build_catalog(200)[0]
+    first = list(client.recommend_stream(track["name"], track["artists"]))
+    assert kinds(first) == ["song_found"] + ["recommendation"] * 5 + ["done"]
+    # La segunda vez sale de la caché con los mismos eventos
+    assert kinds(client.recommend_stream(track["name"], track["artists"])) == kinds(first)